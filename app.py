@@ -1,13 +1,89 @@
-from dash import Dash, html, dcc, Input, Output, State
+import os
+import threading
+import uuid
+from contextlib import closing
+from functools import wraps
+import diskcache
+from flask import Response
+from dash import Dash, html, dcc, Input, Output, State, DiskcacheManager, Patch, ctx, no_update
 import dash_bootstrap_components as dbc
 from src.text_detection import detect_text_emotion
 from src.voice_detection import detect_voice_emotion
-from face_detection import detect_face_emotion
-from src.chatbot import chat_with_bot
-from src.recommend import generate_recommendations, fetch_spotify_recommendations
+from src.face_detection import detect_face_emotion
+from src.chatbot import stream_chat_with_bot, ConversationStore, USE_SCHEDULER
+from src.generation_scheduler import SchedulerBusy
+from src.fusion import detect_multimodal_emotion
+from src.emotions import top_k_emotions
+from src.recommend import fetch_all_recommendations
+from src.recommendation_pool import RecommendationPool
+from src.model_registry import warm_up
+from src.job_slots import JobSlots, JobsBusy
+from src import metrics
+
+# Long-running callbacks run as background jobs tracked in a local diskcache, so web workers stay free.
+# DiskcacheManager starts one process per callback. At most MAX_CONCURRENT_JOBS of them run detection
+# at once and MAX_WAITING_JOBS wait for a free slot; any beyond that end at once with a busy message,
+# so the number of live job processes stays bounded.
+JOB_CACHE_DIR = os.environ.get("EMOTIONIX_JOB_CACHE", "./.job_cache")
+MAX_CONCURRENT_JOBS = int(os.environ.get("EMOTIONIX_MAX_JOBS", 4))
+MAX_WAITING_JOBS = int(os.environ.get("EMOTIONIX_MAX_WAITING_JOBS", 16))
+job_cache = diskcache.Cache(JOB_CACHE_DIR)
+background_callback_manager = DiskcacheManager(job_cache)
+# Every running job holds a lease on one slot. Cancelled or crashed jobs are killed without
+# releasing it, so a lease that stops being renewed expires after JOB_SLOT_LEASE seconds.
+JOB_SLOT_LEASE = 30
+job_slots = JobSlots(
+    job_cache, "emotionix-job-slot", MAX_CONCURRENT_JOBS, lease_seconds=JOB_SLOT_LEASE, max_waiting=MAX_WAITING_JOBS
+)
+# Chat histories live in the job cache so every background job sees the same sessions;
+# the browser only keeps a session id.
+conversation_store = ConversationStore(backend=job_cache)
+# How often the browser polls for streamed chatbot text (Dash's default is 1000 ms)
+CHAT_PROGRESS_INTERVAL_MS = 200
+# Jobs leave their metrics and profiles here; /metrics merges them into the server's own
+metrics.set_shared_dir(os.path.join(JOB_CACHE_DIR, "metrics"))
+# /debug/profiler/* and /debug/trace/* are only served when this is set
+DEBUG_ROUTES = os.environ.get("EMOTIONIX_PROFILER_ROUTES") == "1"
+# Where /debug/trace/start writes the per-request trace log
+TRACE_LOG_PATH = os.environ.get("EMOTIONIX_TRACE_LOG") or "emotionix_trace.jsonl"
+# Background jobs are forked from this process; they hand their metrics to it when they end
+SERVER_PID = os.getpid()
 
 # Initialize the Dash app with a Bootstrap theme
-app = Dash(__name__, external_stylesheets=[dbc.themes.LUX])
+app = Dash(
+    __name__,
+    external_stylesheets=[dbc.themes.LUX],
+    background_callback_manager=background_callback_manager,
+    suppress_callback_exceptions=True,  # Page components are created by display_page
+)
+
+
+@app.server.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+if DEBUG_ROUTES:
+    @app.server.route("/debug/profiler/start")
+    def start_profiler():
+        metrics.start_profiler()
+        return Response("Profiler started\n", mimetype="text/plain")
+
+    @app.server.route("/debug/profiler/stop")
+    def stop_profiler():
+        # Collapsed stacks of the server and of every job run while profiling, ready for flamegraph.pl or speedscope
+        return Response(metrics.stop_profiler(), mimetype="text/plain")
+
+    @app.server.route("/debug/trace/start")
+    def start_trace():
+        # Jobs started from now on inherit the setting when they are forked
+        metrics.set_trace_log(TRACE_LOG_PATH)
+        return Response(f"Tracing to {TRACE_LOG_PATH}\n", mimetype="text/plain")
+
+    @app.server.route("/debug/trace/stop")
+    def stop_trace():
+        metrics.set_trace_log(None)
+        return Response("Tracing stopped\n", mimetype="text/plain")
 
 # Custom Styles for Background Video
 VIDEO_STYLE = {
@@ -50,6 +126,10 @@ BUTTON_STYLE = {
     "marginTop": "10px",
 }
 
+CANCEL_BUTTON_STYLE = {**BUTTON_STYLE, "backgroundColor": "#6c757d", "marginLeft": "10px"}
+
+PROGRESS_STYLE = {"marginTop": "10px", "fontStyle": "italic"}
+
 HEADER_STYLE = {"textAlign": "center", "padding": "10px", "backgroundColor": "#1B1833", "color": "white"}
 
 CARD_STYLE = {
@@ -71,6 +151,7 @@ sidebar = html.Div(
                 dbc.NavLink("Text Detection", href="/text-detection", active="exact"),
                 dbc.NavLink("Voice Detection", href="/voice-detection", active="exact"),
                 dbc.NavLink("Video Detection", href="/video-detection", active="exact"),
+                dbc.NavLink("Multimodal Detection", href="/multimodal-detection", active="exact"),
                 dbc.NavLink("Chatbot", href="/chatbot", active="exact"),
             ],
             vertical=True,
@@ -106,7 +187,13 @@ text_detection_layout = html.Div(
             [
                 html.P("Enter text below to analyze its emotional content."),
                 dbc.Input(id="text-input", placeholder="Type text here...", type="text", className="mb-2",style={"border": "1px solid #441752"}),
-                dbc.Button("Analyze", id="analyze-text-btn", style=BUTTON_STYLE),
+                html.Div(
+                    [
+                        dbc.Button("Analyze", id="analyze-text-btn", style=BUTTON_STYLE),
+                        dbc.Button("Cancel", id="cancel-text-btn", style=CANCEL_BUTTON_STYLE, disabled=True),
+                    ]
+                ),
+                html.P(id="text-progress", style=PROGRESS_STYLE),
                 dcc.Loading(
                     id="loading-text",
                     type="default",
@@ -124,7 +211,13 @@ voice_detection_layout = html.Div(
         dbc.Card(
             [
                 html.P("Click to record and analyze your voice's emotional tone."),
-                dbc.Button("Record Voice", id="record-voice-btn", style=BUTTON_STYLE),
+                html.Div(
+                    [
+                        dbc.Button("Record Voice", id="record-voice-btn", style=BUTTON_STYLE),
+                        dbc.Button("Cancel", id="cancel-voice-btn", style=CANCEL_BUTTON_STYLE, disabled=True),
+                    ]
+                ),
+                html.P(id="voice-progress", style=PROGRESS_STYLE),
                 dcc.Loading(
                     id="loading-voice",
                     type="default",
@@ -142,7 +235,13 @@ video_detection_layout = html.Div(
         dbc.Card(
             [
                 html.P("Click to analyze emotions in your facial expression."),
-                dbc.Button("Detect Emotion", id="video-detect-btn", style=BUTTON_STYLE),
+                html.Div(
+                    [
+                        dbc.Button("Detect Emotion", id="video-detect-btn", style=BUTTON_STYLE),
+                        dbc.Button("Cancel", id="cancel-video-btn", style=CANCEL_BUTTON_STYLE, disabled=True),
+                    ]
+                ),
+                html.P(id="video-progress", style=PROGRESS_STYLE),
                 dcc.Loading(
                     id="loading-video",
                     type="default",
@@ -154,14 +253,47 @@ video_detection_layout = html.Div(
     ]
 )
 
+multimodal_detection_layout = html.Div(
+    [
+        html.H4("Multimodal Detection", style=HEADER_STYLE),
+        dbc.Card(
+            [
+                html.P("Combine text, voice and facial expression into one emotion estimate."),
+                dbc.Input(id="multimodal-text-input", placeholder="Type text here (optional)...", type="text", className="mb-2", style={"border": "1px solid #441752"}),
+                dbc.Checklist(
+                    id="multimodal-sources",
+                    options=[{"label": "Record voice", "value": "voice"}, {"label": "Capture video", "value": "video"}],
+                    value=["voice", "video"],
+                    inline=True,
+                ),
+                html.Div(
+                    [
+                        dbc.Button("Analyze", id="multimodal-detect-btn", style=BUTTON_STYLE),
+                        dbc.Button("Cancel", id="cancel-multimodal-btn", style=CANCEL_BUTTON_STYLE, disabled=True),
+                    ]
+                ),
+                html.P(id="multimodal-progress", style=PROGRESS_STYLE),
+                dcc.Loading(
+                    id="loading-multimodal",
+                    type="default",
+                    children=html.Div(id="multimodal-recommend-output", className="mt-4"),
+                ),
+            ],
+            style=CARD_STYLE,
+        ),
+    ]
+)
+
 # Chatbot Layout
 chatbot_layout = html.Div(
     [
         html.H4("Chatbot", style=HEADER_STYLE),
+        dcc.Store(id="chatbot-session"),
         dbc.Card(
             [
                 html.Div(
                     id="chatbot-conversation",
+                    children=[],
                     style={
                         "height": "300px",
                         "overflowY": "auto",
@@ -191,6 +323,10 @@ chatbot_layout = html.Div(
                         "display": "inline-block",
                     },
                 ),
+                dbc.Button("Cancel", id="cancel-chat-btn", style=CANCEL_BUTTON_STYLE, disabled=True),
+                html.P(id="chatbot-progress", style=PROGRESS_STYLE),
+                # Scheduler replies are decoded on server threads; the browser polls for their text
+                *([dcc.Interval(id="chatbot-poll", interval=CHAT_PROGRESS_INTERVAL_MS, disabled=True)] if USE_SCHEDULER else []),
             ],
             style=CARD_STYLE,
         ),
@@ -229,98 +365,345 @@ def format_recommendations(ai_recommendations, spotify_recommendations):
         style={"padding": "10px", "border": "1px solid #ddd", "borderRadius": "5px", "backgroundColor": "#ffffff"},
     )
 
+# Helper: Time every callback, from its inputs to the layout it returns
+def observed(callback):
+    """
+    Traces the whole callback under its name and records its latency in the per-callback histogram.
+    In a background job process, the job's metrics are handed to the server when the callback ends.
+    """
+    @wraps(callback)
+    def wrapper(*args, **kwargs):
+        try:
+            with metrics.trace(callback.__name__):
+                return callback(*args, **kwargs)
+        finally:
+            if os.getpid() != SERVER_PID:
+                metrics.flush()
+    return wrapper
+
+
+# Helper: Run a background job once one of the bounded job slots is free
+def run_job(set_progress, job):
+    """
+    Runs `job` while holding one of MAX_CONCURRENT_JOBS slots shared by all job processes.
+    Raises JobsBusy without running it when MAX_WAITING_JOBS jobs are already waiting.
+    """
+    set_progress("Waiting for a free worker...")
+    with job_slots.hold(), metrics.profile_job():
+        return job()
+
+
+def busy_message(set_progress, error):
+    set_progress("")
+    return html.P(f"The server is busy: {error}", style={"color": "red"})
+
+
 # Callbacks for text, voice, and video analysis
 @app.callback(
     Output("text-recommend-output", "children"),
     Input("analyze-text-btn", "n_clicks"),
     State("text-input", "value"),
+    background=True,
+    running=[
+        (Output("analyze-text-btn", "disabled"), True, False),
+        (Output("cancel-text-btn", "disabled"), False, True),
+    ],
+    cancel=[Input("cancel-text-btn", "n_clicks")],
+    progress=[Output("text-progress", "children")],
     prevent_initial_call=True,
 )
-def analyze_text_and_recommend(n_clicks, text):
+@observed
+def analyze_text_and_recommend(set_progress, n_clicks, text):
     if text:
-        emotion = detect_text_emotion(text)
-        recommendations = generate_recommendations(emotion)
-        spotify_recommendations = fetch_spotify_recommendations(emotion)
-        return html.Div(
-            [
-                html.P(f"Detected Emotion: {emotion}", style={"fontWeight": "bold"}),
-                format_recommendations(recommendations, spotify_recommendations),
-            ]
-        )
+        def job():
+            set_progress("Detecting emotion...")
+            emotion = detect_text_emotion(text)
+            set_progress("Fetching recommendations...")
+            recommendations, spotify_recommendations = fetch_all_recommendations(emotion)
+            set_progress("")
+            return emotion, recommendations, spotify_recommendations
+
+        try:
+            emotion, recommendations, spotify_recommendations = run_job(set_progress, job)
+        except JobsBusy as e:
+            return busy_message(set_progress, e)
+        with metrics.span("app.render"):
+            return html.Div(
+                [
+                    html.P(f"Detected Emotion: {emotion}", style={"fontWeight": "bold"}),
+                    format_recommendations(recommendations, spotify_recommendations),
+                ]
+            )
     return html.P("Please enter text to analyze.", style={"color": "red"})
 
 @app.callback(
     Output("voice-recommend-output", "children"),
     Input("record-voice-btn", "n_clicks"),
+    background=True,
+    running=[
+        (Output("record-voice-btn", "disabled"), True, False),
+        (Output("cancel-voice-btn", "disabled"), False, True),
+    ],
+    cancel=[Input("cancel-voice-btn", "n_clicks")],
+    progress=[Output("voice-progress", "children")],
     prevent_initial_call=True,
 )
-def analyze_voice_and_recommend(n_clicks):
-    emotion = detect_voice_emotion()
-    recommendations = generate_recommendations(emotion)
-    spotify_recommendations = fetch_spotify_recommendations(emotion)
-    return html.Div(
-        [
-            html.P(f"Detected Emotion: {emotion}", style={"fontWeight": "bold"}),
-            format_recommendations(recommendations, spotify_recommendations),
-        ]
-    )
+@observed
+def analyze_voice_and_recommend(set_progress, n_clicks):
+    def job():
+        set_progress("Recording and detecting emotion...")
+        emotion = detect_voice_emotion()
+        set_progress("Fetching recommendations...")
+        recommendations, spotify_recommendations = fetch_all_recommendations(emotion)
+        set_progress("")
+        return emotion, recommendations, spotify_recommendations
+
+    try:
+        emotion, recommendations, spotify_recommendations = run_job(set_progress, job)
+    except JobsBusy as e:
+        return busy_message(set_progress, e)
+    with metrics.span("app.render"):
+        return html.Div(
+            [
+                html.P(f"Detected Emotion: {emotion}", style={"fontWeight": "bold"}),
+                format_recommendations(recommendations, spotify_recommendations),
+            ]
+        )
 
 @app.callback(
     Output("video-recommend-output", "children"),
     Input("video-detect-btn", "n_clicks"),
+    background=True,
+    running=[
+        (Output("video-detect-btn", "disabled"), True, False),
+        (Output("cancel-video-btn", "disabled"), False, True),
+    ],
+    cancel=[Input("cancel-video-btn", "n_clicks")],
+    progress=[Output("video-progress", "children")],
     prevent_initial_call=True,
 )
-def analyze_video_and_recommend(n_clicks):
-    emotion = detect_face_emotion(duration=5)
-    recommendations = generate_recommendations(emotion)
-    spotify_recommendations = fetch_spotify_recommendations(emotion)
-    return html.Div(
-        [
-            html.P(f"Detected Emotion: {emotion}", style={"fontWeight": "bold"}),
-            format_recommendations(recommendations, spotify_recommendations),
-        ]
-    )
+@observed
+def analyze_video_and_recommend(set_progress, n_clicks):
+    def job():
+        set_progress("Capturing video and detecting emotion...")
+        # Stops before 5 seconds once the frames agree on the leading emotion
+        emotion = detect_face_emotion(duration=5, adaptive=True)
+        set_progress("Fetching recommendations...")
+        recommendations, spotify_recommendations = fetch_all_recommendations(emotion)
+        set_progress("")
+        return emotion, recommendations, spotify_recommendations
+
+    try:
+        emotion, recommendations, spotify_recommendations = run_job(set_progress, job)
+    except JobsBusy as e:
+        return busy_message(set_progress, e)
+    with metrics.span("app.render"):
+        return html.Div(
+            [
+                html.P(f"Detected Emotion: {emotion}", style={"fontWeight": "bold"}),
+                format_recommendations(recommendations, spotify_recommendations),
+            ]
+        )
 
 
-# Chatbot Handling: Retaining history and sending responses
 @app.callback(
-    [
-        Output("chatbot-conversation", "children"),
-        Output("chatbot-input", "value"),
+    Output("multimodal-recommend-output", "children"),
+    Input("multimodal-detect-btn", "n_clicks"),
+    State("multimodal-text-input", "value"),
+    State("multimodal-sources", "value"),
+    background=True,
+    running=[
+        (Output("multimodal-detect-btn", "disabled"), True, False),
+        (Output("cancel-multimodal-btn", "disabled"), False, True),
     ],
-    Input("send-chat-btn", "n_clicks"),
-    State("chatbot-input", "value"),
-    State("chatbot-conversation", "children"),
+    cancel=[Input("cancel-multimodal-btn", "n_clicks")],
+    progress=[Output("multimodal-progress", "children")],
     prevent_initial_call=True,
 )
-def handle_chatbot_message(n_clicks, user_input, conversation):
-    if not conversation:
-        conversation = []
-
-    if user_input:
-        # Add user input to the conversation
-        conversation.append(
-            html.Div(f"You: {user_input}", style={"color": "#000", "marginBottom": "10px", "fontWeight": "bold"})
+@observed
+def analyze_multimodal_and_recommend(set_progress, n_clicks, text, sources):
+    sources = sources or []
+    if not text and not sources:
+        return html.P("Please enter text or choose voice/video to analyze.", style={"color": "red"})
+
+    def job():
+        set_progress("Detecting emotion from all selected inputs...")
+        result = detect_multimodal_emotion(text=text or None, audio="voice" in sources or None, video="video" in sources or None)
+        set_progress("Fetching recommendations...")
+        recommendations, spotify_recommendations = fetch_all_recommendations(result["emotion"])
+        set_progress("")
+        return result, recommendations, spotify_recommendations
+
+    try:
+        result, recommendations, spotify_recommendations = run_job(set_progress, job)
+    except JobsBusy as e:
+        return busy_message(set_progress, e)
+    with metrics.span("app.render"):
+        modality_lines = [
+            html.Li(f"{modality.capitalize()}: {modality_result['emotion']}")
+            for modality, modality_result in result["modalities"].items()
+        ]
+        top_emotions = ", ".join(
+            f"{label} ({score:.0%})" for label, score in top_k_emotions(result["scores"])
+        ) if result["scores"] is not None else "n/a"
+        return html.Div(
+            [
+                html.P(f"Detected Emotion: {result['emotion']}", style={"fontWeight": "bold"}),
+                html.P(f"Top emotions: {top_emotions}"),
+                html.Ul(modality_lines),
+                format_recommendations(recommendations, spotify_recommendations),
+            ]
         )
+
+
+def _user_message(user_input):
+    return html.Div(f"You: {user_input}", style={"color": "#000", "marginBottom": "10px", "fontWeight": "bold"})
+
+
+def _bot_message(bot_response):
+    return html.Div(
+        f"Bot: {bot_response}",
+        style={"color": "#007bff", "marginBottom": "10px", "fontWeight": "bold"},
+    )
+
+
+def _chatbot_messages(*messages):
+    # Patch appends to the displayed conversation instead of resending all of it
+    with metrics.span("app.render"):
+        conversation = Patch()
+        for message in messages:
+            conversation.append(message)
+        return conversation
+
+
+CHATBOT_OUTPUTS = [
+    Output("chatbot-conversation", "children"),
+    Output("chatbot-input", "value"),
+    Output("chatbot-session", "data"),
+]
+CHATBOT_INPUTS = [
+    Input("send-chat-btn", "n_clicks"),
+    State("chatbot-input", "value"),
+    State("chatbot-session", "data"),
+]
+
+# Chatbot Handling: history is kept server-side per session; only new messages are sent to the browser
+if USE_SCHEDULER:
+    # Chats run on server threads so every user shares the process's generation scheduler,
+    # which batches their replies together. Its queue limit replaces the job slots.
+    # The send callback only starts a thread that streams the reply into chat_replies;
+    # the chatbot-poll interval then shows the text as it arrives, so no request thread
+    # ever waits for generation.
+    chat_replies = {}
+    chat_replies_lock = threading.Lock()
+
+    def _stream_reply(user_input, session_id, reply):
         try:
-            # Get bot response
-            bot_response = chat_with_bot(user_input)
+            with metrics.trace("chatbot_reply"):
+                # Closing the stream early takes the request out of the scheduler's batch
+                with closing(stream_chat_with_bot(user_input, session_id=session_id, store=conversation_store)) as pieces:
+                    for piece in pieces:
+                        if reply["cancelled"].is_set():
+                            break
+                        reply["text"] += piece
+        except SchedulerBusy:
+            reply["text"] = "I'm talking with a lot of people right now, please try again in a moment."
         except Exception as e:
-            bot_response = f"Error: {str(e)}"
+            reply["text"] = f"Error: {str(e)}"
+        reply["done"].set()
 
-        # Add bot response to the conversation
-        conversation.append(
-            html.Div(
-                f"Bot: {bot_response}",
-                style={"color": "#007bff", "marginBottom": "10px", "fontWeight": "bold"},
-            )
-        )
+    @app.callback(
+        CHATBOT_OUTPUTS + [
+            Output("chatbot-poll", "disabled"),
+            Output("send-chat-btn", "disabled"),
+            Output("cancel-chat-btn", "disabled"),
+            Output("chatbot-progress", "children"),
+        ],
+        CHATBOT_INPUTS,
+        prevent_initial_call=True,
+    )
+    @observed
+    def handle_chatbot_message(n_clicks, user_input, session_id):
+        session_id = session_id or uuid.uuid4().hex
+        if not user_input:
+            return Patch(), "", session_id, no_update, no_update, no_update, no_update
+        reply = {"text": "", "done": threading.Event(), "cancelled": threading.Event()}
+        with chat_replies_lock:
+            if session_id in chat_replies:
+                # The previous reply is still streaming; the send button is disabled until it ends
+                return no_update, no_update, session_id, no_update, no_update, no_update, no_update
+            chat_replies[session_id] = reply
+        threading.Thread(
+            target=_stream_reply, args=(user_input, session_id, reply), name="chatbot-reply", daemon=True
+        ).start()
+        conversation = _chatbot_messages(_user_message(user_input))
+        return conversation, "", session_id, False, True, False, "Bot is typing..."  # Clear the input field
+
+    @app.callback(
+        Output("chatbot-conversation", "children", allow_duplicate=True),
+        Output("chatbot-poll", "disabled", allow_duplicate=True),
+        Output("send-chat-btn", "disabled", allow_duplicate=True),
+        Output("cancel-chat-btn", "disabled", allow_duplicate=True),
+        Output("chatbot-progress", "children", allow_duplicate=True),
+        Input("chatbot-poll", "n_intervals"),
+        Input("cancel-chat-btn", "n_clicks"),
+        State("chatbot-session", "data"),
+        prevent_initial_call=True,
+    )
+    @observed
+    def poll_chatbot_reply(n_intervals, cancel_clicks, session_id):
+        with chat_replies_lock:
+            reply = chat_replies.get(session_id)
+        if reply is None:
+            return no_update, True, False, True, ""
+        if ctx.triggered_id == "cancel-chat-btn":
+            reply["cancelled"].set()
+        if not reply["done"].is_set():
+            return no_update, False, True, False, f"Bot: {reply['text']}" if reply["text"] else "Bot is typing..."
+        with chat_replies_lock:
+            chat_replies.pop(session_id, None)
+        return _chatbot_messages(_bot_message(reply["text"].strip())), True, False, True, ""
+
+else:
+    @app.callback(
+        CHATBOT_OUTPUTS,
+        CHATBOT_INPUTS,
+        background=True,
+        running=[
+            (Output("send-chat-btn", "disabled"), True, False),
+            (Output("cancel-chat-btn", "disabled"), False, True),
+        ],
+        cancel=[Input("cancel-chat-btn", "n_clicks")],
+        progress=[Output("chatbot-progress", "children")],
+        interval=CHAT_PROGRESS_INTERVAL_MS,
+        prevent_initial_call=True,
+    )
+    @observed
+    def handle_chatbot_message(set_progress, n_clicks, user_input, session_id):
+        session_id = session_id or uuid.uuid4().hex
+        if not user_input:
+            return Patch(), "", session_id
 
-    # Ensure the latest messages are visible
-    return conversation, ""  # Clear the input field
+        def job():
+            set_progress("Bot is typing...")
+            # Show the reply as it is decoded; the final message replaces it below
+            response = ""
+            for piece in stream_chat_with_bot(user_input, session_id=session_id, store=conversation_store):
+                response += piece
+                set_progress(f"Bot: {response}")
+            return response.strip()
+
+        try:
+            # Get bot response
+            bot_response = run_job(set_progress, job)
+        except Exception as e:
+            bot_response = f"Error: {str(e)}"
+        set_progress("")
+        return _chatbot_messages(_user_message(user_input), _bot_message(bot_response)), "", session_id  # Clear the input field
 
 
 @app.callback(Output("page-content", "children"), Input("url", "pathname"))
+@observed
 def display_page(pathname):
     if pathname == "/text-detection":
         return text_detection_layout
@@ -328,10 +711,24 @@ def display_page(pathname):
         return voice_detection_layout
     elif pathname == "/video-detection":
         return video_detection_layout
+    elif pathname == "/multimodal-detection":
+        return multimodal_detection_layout
     elif pathname == "/chatbot":
         return chatbot_layout
     
 
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
\ No newline at end of file
+    DEBUG = True
+    # In debug mode the reloader re-runs this script in a child process that serves the app;
+    # the parent only watches files, so it loads nothing.
+    if not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        # Models load on first use; list any to preload in EMOTIONIX_WARMUP (e.g. "text_classifier,chatbot").
+        # Background jobs are forked from this process, so models warmed up here are shared with every job
+        # instead of being reloaded per job. Loading blocks startup so no job is forked mid-load.
+        warm_up(background=False)
+        # Serve recommendations from precomputed per-emotion pools refreshed in the background.
+        # Jobs forked from this process sample the pool contents as of their fork.
+        if os.environ.get("EMOTIONIX_REC_POOL") == "1":
+            RecommendationPool().start()
+    app.run_server(debug=DEBUG)
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+Compares the single-STFT feature extractor (src/audio_features.py) with the previous path that
+called each librosa feature function on the raw audio.
+
+    python -m benchmarks.bench_audio_features --clips 32 --seconds 3
+"""
+import argparse
+import time
+import librosa
+import numpy as np
+from src.audio_features import extract_features
+
+
+def per_feature_path(audio_data, sample_rate):
+    # The extractor used before src/audio_features.py: every feature recomputes the STFT
+    mfccs = np.mean(librosa.feature.mfcc(y=audio_data, sr=sample_rate, n_mfcc=13).T, axis=0)
+    chroma = np.mean(librosa.feature.chroma_stft(y=audio_data, sr=sample_rate).T, axis=0)
+    mel = np.mean(librosa.feature.melspectrogram(y=audio_data, sr=sample_rate).T, axis=0)
+    contrast = np.mean(librosa.feature.spectral_contrast(y=audio_data, sr=sample_rate).T, axis=0)
+    return np.concatenate((mfccs, chroma, mel, contrast))
+
+
+def synthetic_clips(count, seconds, sample_rate, seed=0):
+    """
+    Harmonic tones with noise, one per clip, as a (count, samples) float32 array. Loudness varies
+    by up to 60 dB between clips, so batch-dependent scaling (e.g. a shared dB floor) shows up.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    clips = [
+        10 ** rng.uniform(-3, 0) * (
+            np.sin(2 * np.pi * rng.uniform(100, 400) * t) + 0.3 * np.sin(2 * np.pi * rng.uniform(800, 1600) * t)
+            + 0.05 * rng.standard_normal(t.size)
+        )
+        for _ in range(count)
+    ]
+    return np.asarray(clips, dtype=np.float32)
+
+
+def edge_case_clips(clips):
+    """
+    Clips whose spectra reach the dB floor: one digitally silent, one with a silent second half
+    and one quiet copy of a loud clip. Noise alone never hits the floor, so these catch any
+    feature whose floor is taken from the whole batch rather than from each clip.
+    """
+    half_silent = clips[0].copy()
+    half_silent[half_silent.size // 2:] = 0.0
+    return np.stack([np.zeros_like(clips[0]), half_silent, 1e-3 * clips[0], clips[0] / np.abs(clips[0]).max()])
+
+
+def best_of(repeats, function):
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark audio feature extraction.")
+    parser.add_argument("--clips", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--sample-rate", type=int, default=22050)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    clips = synthetic_clips(args.clips, args.seconds, args.sample_rate)
+    extract_features(clips[:1], args.sample_rate)  # Warm up librosa's caches and JIT
+
+    old_time, old_rows = best_of(args.repeats, lambda: np.stack([per_feature_path(clip, args.sample_rate) for clip in clips]))
+    loop_time, loop_rows = best_of(args.repeats, lambda: np.stack([extract_features(clip, args.sample_rate) for clip in clips]))
+    batch_time, batch_rows = best_of(args.repeats, lambda: extract_features(clips, args.sample_rate))
+
+    print(f"{args.clips} clips of {args.seconds:.1f}s at {args.sample_rate} Hz (best of {args.repeats})")
+    for name, elapsed in (("per-feature", old_time), ("single STFT", loop_time), ("single STFT, batched", batch_time)):
+        print(f"{name:>22}: {1000 * elapsed:8.1f} ms total, {1000 * elapsed / args.clips:6.2f} ms/clip, {old_time / elapsed:5.2f}x")
+    print(f"max abs difference vs per-feature: {np.abs(old_rows - loop_rows).max():.2e} (single), "
+          f"{np.abs(old_rows - batch_rows).max():.2e} (batched)")
+
+    # Each clip's features must not depend on the other clips in its batch
+    mixed = np.concatenate((clips, edge_case_clips(clips)))
+    for feature_set in ("full", "mfcc"):
+        expected = np.stack([extract_features(clip, args.sample_rate, feature_set) for clip in mixed])
+        actual = extract_features(mixed, args.sample_rate, feature_set)
+        if not np.allclose(expected, actual, rtol=1e-4, atol=1e-3):
+            raise SystemExit(f"Batched '{feature_set}' features differ from single-clip features by up to "
+                             f"{np.abs(expected - actual).max():.3g}.")
+    print("batched features match single-clip features for silent, half-silent and mixed-loudness clips")
+
+
+if __name__ == "__main__":
+    main()
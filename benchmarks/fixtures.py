@@ -0,0 +1,143 @@
+"""
+Synthetic, seeded inputs for the benchmarks, plus local stand-ins for Gemini, Spotify and the
+trained voice model so no benchmark needs network access or a trained model file.
+"""
+import os
+import time
+import numpy as np
+
+SAMPLE_RATE = 22050
+
+_TEXT_TEMPLATES = (
+    "I am so {adj} about {thing} today!",
+    "Honestly, {thing} makes me feel {adj}.",
+    "Why does {thing} always leave me this {adj}?",
+    "Can't stop thinking about {thing}, I'm {adj}.",
+)
+_ADJECTIVES = ("happy", "sad", "furious", "hopeful", "nervous", "calm", "excited", "lonely")
+_THINGS = ("the exam", "my new job", "the weather", "this song", "the trip", "my team", "the news")
+
+
+def synthetic_texts(count, seed=0):
+    """Returns `count` short social-media style sentences."""
+    rng = np.random.default_rng(seed)
+    return [
+        _TEXT_TEMPLATES[rng.integers(len(_TEXT_TEMPLATES))].format(
+            adj=_ADJECTIVES[rng.integers(len(_ADJECTIVES))], thing=_THINGS[rng.integers(len(_THINGS))]
+        )
+        for _ in range(count)
+    ]
+
+
+def synthetic_clip(seconds=3.0, sr=SAMPLE_RATE, seed=0):
+    """Returns a voiced-like float32 clip: a gliding fundamental with harmonics, amplitude modulation and noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    f0 = rng.uniform(110, 260) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.5, 2) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 5) * t) ** 2
+    clip = 0.3 * envelope * voice + 0.02 * rng.standard_normal(t.size)
+    return clip.astype(np.float32)
+
+
+def write_wav_dataset(root, actors=2, clips_per_actor=8, seconds=3.0, sr=SAMPLE_RATE):
+    """Writes a RAVDESS-shaped dataset (Actor_XX/03-01-EE-01-01-01-XX.wav) and returns the number of files."""
+    import soundfile as sf
+    count = 0
+    for actor in range(1, actors + 1):
+        actor_dir = os.path.join(root, f"Actor_{actor:02d}")
+        os.makedirs(actor_dir, exist_ok=True)
+        for i in range(clips_per_actor):
+            emotion_id = i % 8 + 1
+            path = os.path.join(actor_dir, f"03-01-{emotion_id:02d}-01-01-{i // 8 + 1:02d}-{actor:02d}.wav")
+            sf.write(path, synthetic_clip(seconds, sr, seed=actor * 100 + i), sr)
+            count += 1
+    return count
+
+
+def synthetic_frame(seed=0, size=(640, 480)):
+    """Returns a BGR frame with a face-like drawing (head, eyes, mouth) on a noisy background."""
+    import cv2
+    rng = np.random.default_rng(seed)
+    width, height = size
+    frame = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+    center = (width // 2 + int(rng.integers(-20, 20)), height // 2 + int(rng.integers(-20, 20)))
+    axes = (width // 8, height // 4)
+    cv2.ellipse(frame, center, axes, 0, 0, 360, (150, 180, 220), -1)
+    for dx in (-axes[0] // 2, axes[0] // 2):
+        cv2.circle(frame, (center[0] + dx, center[1] - axes[1] // 4), axes[0] // 8, (40, 40, 40), -1)
+    smile = int(rng.integers(-1, 2))
+    cv2.ellipse(frame, (center[0], center[1] + axes[1] // 2), (axes[0] // 2, max(1, 10 + 10 * smile)),
+                0, 0 if smile >= 0 else 180, 180 if smile >= 0 else 360, (60, 40, 120), 4)
+    return frame
+
+
+def write_video(path, frames=60, fps=30, size=(640, 480)):
+    """Writes an MJPG .avi of synthetic face frames and returns the path."""
+    import cv2
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    for i in range(frames):
+        writer.write(synthetic_frame(seed=i, size=size))
+    writer.release()
+    return path
+
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGemini:
+    """Stands in for the Gemini model: fixed text after a fixed delay."""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        return _StubResponse(f"Try a short walk and a favourite playlist. ({len(prompt)} prompt chars)")
+
+
+class StubSpotify:
+    """Stands in for the Spotify client: three playlists after a fixed delay."""
+
+    def __init__(self, latency=0.03):
+        self.latency = latency
+
+    def search(self, q, type="playlist", limit=3, offset=0):
+        time.sleep(self.latency)
+        items = [
+            {"name": f"{q} #{offset + i}", "external_urls": {"spotify": f"https://open.spotify.com/playlist/{offset + i}"}}
+            for i in range(limit)
+        ]
+        return {"playlists": {"items": items}}
+
+
+def install_recommendation_stubs(gemini_latency=0.05, spotify_latency=0.03):
+    """Registers the stub Gemini and Spotify clients and empties the recommendation caches."""
+    from src import recommend
+    from src.model_registry import register_model
+    register_model("gemini", lambda: StubGemini(gemini_latency))
+    register_model("spotify", lambda: StubSpotify(spotify_latency))
+    recommend.gemini_cache.clear()
+    recommend.spotify_cache.clear()
+
+
+def install_voice_model_stub(seed=0):
+    """
+    Registers a small SVC trained on random 13-value feature vectors in place of emotion_model.pkl.
+    The model is fitted here, during benchmark setup, so no timed call pays for it.
+    Call it after importing src.voice_detection, whose import registers the real loader.
+    """
+    from sklearn.svm import SVC
+    from src.emotions import VOICE_MODEL_LABELS
+    from src.model_registry import register_model
+
+    rng = np.random.default_rng(seed)
+    # Unit-scale features keep the fit well-conditioned, so it takes a fraction of a second
+    features = rng.normal(size=(40 * len(VOICE_MODEL_LABELS), 13))
+    labels = np.repeat(VOICE_MODEL_LABELS, 40)
+    model = SVC(kernel="linear", probability=True, random_state=seed).fit(features, labels)
+    model.feature_set_ = "mfcc"
+    register_model("voice_svc", lambda: model)
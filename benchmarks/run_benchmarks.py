@@ -0,0 +1,379 @@
+"""
+Benchmark suite for the detectors, the chatbot, recommendations and the app callbacks.
+
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.run_benchmarks --only text_batch voice_detect --repeats 50
+    python -m benchmarks.run_benchmarks --compare baseline.json --output results.json
+    python -m benchmarks.run_benchmarks --input results.json --compare baseline.json
+
+Every benchmark runs in a fresh process, so its peak RSS and first-call (model load) time are
+its own. Inputs are synthetic and seeded (benchmarks/fixtures.py); Gemini, Spotify and the
+trained voice model are replaced by local stubs. Benchmarks whose dependencies are not
+installed are recorded as skipped.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from benchmarks import fixtures
+
+# A benchmark is slower than its baseline when its p50 latency or peak RSS grew by more than this fraction
+DEFAULT_THRESHOLD = 0.10
+
+
+def _noop_progress(*args):
+    pass
+
+
+def _require(*modules):
+    # Detectors catch their own errors, so check optional dependencies up front to report a skip
+    import importlib
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _check(result):
+    if result is None or (isinstance(result, tuple) and result[0] is None):
+        raise RuntimeError("detection returned no result")
+    return result
+
+
+# Each setup function returns (call, items per call). The setup itself is not timed.
+
+def bench_text_single(workdir):
+    _require("torch", "transformers")
+    from src.text_detection import detect_text_emotion, result_cache
+    texts = fixtures.synthetic_texts(64)
+    state = {"i": 0}
+
+    def call():
+        state["i"] += 1
+        # Measure the model, not the result cache
+        if result_cache is not None:
+            result_cache.clear()
+        _check(detect_text_emotion(texts[state["i"] % len(texts)], return_scores=True))
+    return call, 1
+
+
+def bench_text_batch(workdir):
+    _require("torch", "transformers")
+    from src.text_detection import detect_text_emotion_batch, result_cache
+    texts = fixtures.synthetic_texts(32)
+
+    def call():
+        if result_cache is not None:
+            result_cache.clear()
+        _check(detect_text_emotion_batch(texts, return_scores=True))
+    return call, len(texts)
+
+
+def bench_text_long(workdir):
+    _require("torch", "transformers")
+    from src.text_detection import detect_text_emotion, result_cache
+    # About 2,500 tokens, split into overlapping windows classified in one call
+    document = " ".join(fixtures.synthetic_texts(256, seed=4))
+
+    def call():
+        if result_cache is not None:
+            result_cache.clear()
+        _check(detect_text_emotion(document, return_scores=True))
+    return call, 1
+
+
+def bench_voice_mfcc(workdir):
+    from src.voice_detection import extract_features
+    clip = fixtures.synthetic_clip(3.0)
+    return lambda: extract_features(clip), 1
+
+
+def bench_voice_detect(workdir):
+    from src.voice_detection import detect_voice_emotion
+    fixtures.install_voice_model_stub()
+    clip = fixtures.synthetic_clip(3.0)
+    return lambda: _check(detect_voice_emotion(return_scores=True, audio=clip)), 1
+
+
+def bench_train_features(workdir):
+    from src.train_model import extract_features
+    clip = fixtures.synthetic_clip(3.0)
+    return lambda: extract_features(clip, fixtures.SAMPLE_RATE), 1
+
+
+def bench_train_dataset(workdir):
+    from src.train_model import extract_features_from_dataset
+    dataset = os.path.join(workdir, "dataset")
+    count = fixtures.write_wav_dataset(dataset, actors=2, clips_per_actor=8)
+    # No feature cache, so every run extracts from the audio
+    return lambda: extract_features_from_dataset(dataset, feature_set="full", cache_dir=None), count
+
+
+def bench_face_analyze(workdir):
+    _require("deepface")
+    import cv2
+    import src.face_detection  # noqa: F401  (registers the DeepFace loader)
+    from src.model_registry import get_model
+    DeepFace = get_model("deepface")
+    crop = cv2.resize(fixtures.synthetic_frame()[120:360, 240:400], (224, 224))
+    # The per-crop call detect_face_emotion makes after tracking the face
+    return lambda: DeepFace.analyze(crop, actions=["emotion"], detector_backend="skip", enforce_detection=False, silent=True), 1
+
+
+def bench_face_video(workdir):
+    _require("deepface")
+    from src.face_detection import detect_face_emotion
+    frames = 60
+    video = fixtures.write_video(os.path.join(workdir, "faces.avi"), frames=frames)
+    return lambda: _check(detect_face_emotion(duration=None, source=video, return_scores=True)), frames
+
+
+def bench_face_adaptive(workdir):
+    _require("deepface")
+    from src.face_detection import detect_face_emotion
+    video = fixtures.write_video(os.path.join(workdir, "faces.avi"), frames=150)
+    # Items per call is the video length; the run stops as soon as the scores converge
+    return lambda: _check(detect_face_emotion(duration=None, source=video, return_scores=True, adaptive=True)), 150
+
+
+def bench_chat(workdir):
+    _require("torch", "transformers")
+    from src.chatbot import chat_with_bot
+    texts = fixtures.synthetic_texts(16, seed=1)
+    state = {"i": 0}
+
+    def call():
+        state["i"] += 1
+        chat_with_bot(texts[state["i"] % len(texts)])
+    return call, 1
+
+
+def bench_chat_scheduler(workdir):
+    _require("torch", "transformers")
+    # Read when src.chatbot is imported; each benchmark runs in its own process
+    os.environ["EMOTIONIX_CHAT_SCHEDULER"] = "1"
+    from concurrent.futures import ThreadPoolExecutor
+    from src.chatbot import chat_with_bot
+    texts = fixtures.synthetic_texts(8, seed=1)
+    executor = ThreadPoolExecutor(max_workers=len(texts))
+
+    def call():
+        # Eight users chatting at once share the scheduler's batches; compare items/s with the chat benchmark
+        list(executor.map(chat_with_bot, texts))
+    return call, len(texts)
+
+
+def bench_recommend(workdir):
+    from src import recommend
+    fixtures.install_recommendation_stubs()
+
+    def call():
+        # Cold path: both stubbed backends are called concurrently
+        recommend.gemini_cache.clear()
+        recommend.spotify_cache.clear()
+        recommend.fetch_all_recommendations("sad")
+    return call, 1
+
+
+def bench_app_text(workdir):
+    _require("torch", "transformers")
+    os.environ.setdefault("EMOTIONIX_JOB_CACHE", os.path.join(workdir, "job_cache"))
+    import app
+    from src import recommend, text_detection
+    fixtures.install_recommendation_stubs()
+    texts = fixtures.synthetic_texts(64, seed=2)
+    state = {"i": 0}
+
+    def call():
+        state["i"] += 1
+        recommend.gemini_cache.clear()
+        recommend.spotify_cache.clear()
+        if text_detection.result_cache is not None:
+            text_detection.result_cache.clear()
+        app.analyze_text_and_recommend(_noop_progress, state["i"], texts[state["i"] % len(texts)])
+    return call, 1
+
+
+def bench_app_chat(workdir):
+    _require("torch", "transformers")
+    os.environ.setdefault("EMOTIONIX_JOB_CACHE", os.path.join(workdir, "job_cache"))
+    import app
+    texts = fixtures.synthetic_texts(16, seed=3)
+    state = {"i": 0}
+
+    def call():
+        state["i"] += 1
+        if app.USE_SCHEDULER:
+            # The callback returns at once and the reply streams on a server thread; collect it as the poll would
+            app.handle_chatbot_message(state["i"], texts[state["i"] % len(texts)], "bench-session")
+            app.chat_replies.pop("bench-session")["done"].wait()
+        else:
+            app.handle_chatbot_message(_noop_progress, state["i"], texts[state["i"] % len(texts)], "bench-session")
+    return call, 1
+
+
+BENCHMARKS = {
+    "text_single": bench_text_single,
+    "text_batch": bench_text_batch,
+    "text_long": bench_text_long,
+    "voice_mfcc": bench_voice_mfcc,
+    "voice_detect": bench_voice_detect,
+    "train_features": bench_train_features,
+    "train_dataset": bench_train_dataset,
+    "face_analyze": bench_face_analyze,
+    "face_video": bench_face_video,
+    "face_adaptive": bench_face_adaptive,
+    "chat": bench_chat,
+    "chat_scheduler": bench_chat_scheduler,
+    "recommend": bench_recommend,
+    "app_text": bench_app_text,
+    "app_chat": bench_app_chat,
+}
+
+# Slow benchmarks get fewer timed iterations
+REPEATS = {"text_long": 5, "train_dataset": 3, "face_video": 3, "face_adaptive": 3, "chat": 5, "chat_scheduler": 3, "app_chat": 5}
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KB on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _summarize(latencies, items):
+    latencies_ms = 1000 * np.asarray(latencies)
+    return {
+        "repeats": len(latencies),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p90_ms": float(np.percentile(latencies_ms, 90)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "mean_ms": float(latencies_ms.mean()),
+        "throughput_items_per_s": float(items * len(latencies) / np.sum(latencies)),
+    }
+
+
+def run_one(name, repeats):
+    """Runs one benchmark in the current process and returns its result dict."""
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, "w") as devnull:
+        try:
+            # Keep the detectors' progress prints out of the report
+            with contextlib.redirect_stdout(devnull):
+                call, items = BENCHMARKS[name](workdir)
+                start_time = time.perf_counter()
+                call()  # The first call includes lazy model loading
+                first_call_ms = 1000 * (time.perf_counter() - start_time)
+                latencies = []
+                for _ in range(repeats):
+                    start_time = time.perf_counter()
+                    call()
+                    latencies.append(time.perf_counter() - start_time)
+        except ImportError as e:
+            return {"status": "skipped", "reason": str(e)}
+        except Exception as e:
+            return {"status": "error", "reason": f"{type(e).__name__}: {e}"}
+    result = {"status": "ok", "items_per_call": items, "first_call_ms": first_call_ms}
+    result.update(_summarize(latencies, items))
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_suite(names, repeats=None):
+    """Runs each benchmark in its own spawned process and returns the results document."""
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        print(f"Running {name}...", flush=True)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[name] = executor.submit(run_one, name, repeats or REPEATS.get(name, 20)).result()
+    return {"environment": _environment(), "results": results}
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares two results documents.
+
+    Returns:
+    - list[str]: Names of benchmarks whose p50 latency or peak RSS grew by more than `threshold`.
+    """
+    regressions = []
+    print(f"{'benchmark':<16} {'p50 base':>10} {'p50 now':>10} {'change':>8} {'rss base':>9} {'rss now':>9}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if result.get("status") != "ok" or not base or base.get("status") != "ok":
+            continue
+        latency_change = result["p50_ms"] / base["p50_ms"] - 1
+        rss_change = result["peak_rss_mb"] / base["peak_rss_mb"] - 1
+        regressed = latency_change > threshold or rss_change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<16} {base['p50_ms']:>10.2f} {result['p50_ms']:>10.2f} {latency_change:>+8.1%} "
+              f"{base['peak_rss_mb']:>9.1f} {result['peak_rss_mb']:>9.1f}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def print_results(document):
+    print(f"{'benchmark':<16} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'items/s':>10} {'first ms':>10} {'peak RSS':>9}")
+    for name, result in document["results"].items():
+        if result["status"] != "ok":
+            print(f"{name:<16} {result['status']}: {result['reason']}")
+            continue
+        print(f"{name:<16} {result['p50_ms']:>9.2f} {result['p90_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+              f"{result['throughput_items_per_s']:>10.1f} {result['first_call_ms']:>10.1f} {result['peak_rss_mb']:>8.1f}M")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the EmotionIX benchmark suite.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run (default: all).")
+    parser.add_argument("--repeats", type=int, default=None, help="Timed iterations per benchmark.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--input", help="Compare an existing results file instead of running the suite.")
+    parser.add_argument("--compare", help="Baseline results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative growth of p50 latency and peak RSS.")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            document = json.load(f)
+    else:
+        document = run_suite(args.only or list(BENCHMARKS), args.repeats)
+    print_results(document)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(document, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import librosa
+import numpy as np
+
+# STFT settings; these are librosa's defaults, which the models were trained with
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MFCC = 13
+
+# "mfcc": mean MFCCs (13 values). "full": mean MFCCs, chroma, mel spectrogram and spectral contrast (13 + 12 + 128 + 7).
+FEATURE_SETS = ("mfcc", "full")
+
+
+def spectrogram(audio, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Computes the STFT once and returns its (power, magnitude) spectrograms.
+    Leading dimensions of `audio` (e.g. a batch of clips) are kept.
+    """
+    magnitude = np.abs(librosa.stft(audio, n_fft=n_fft, hop_length=hop_length))
+    return magnitude ** 2, magnitude
+
+
+def power_to_db(power, top_db=80.0):
+    """
+    librosa.power_to_db with its defaults (ref=1.0, top_db=80), applied per clip: the top_db
+    floor is taken from each clip's own maximum, so batching never changes a clip's values.
+    """
+    log_power = librosa.power_to_db(power, top_db=None)
+    return np.maximum(log_power, log_power.max(axis=(-2, -1), keepdims=True) - top_db)
+
+
+def extract_features(audio, sr, feature_set="full", n_mfcc=N_MFCC):
+    """
+    Extracts the mean feature vector of one clip or of a batch of equal-length clips.
+
+    Every feature is derived from a single STFT: the mel spectrogram from the power spectrogram,
+    the MFCCs from the mel spectrogram, chroma from the power spectrogram and spectral contrast
+    from the magnitude spectrogram. The values match calling the librosa feature functions on
+    the raw audio one by one.
+
+    Args:
+    - audio (np.ndarray): 1-D signal, or 2-D (n_clips, n_samples) batch.
+    - sr (int): Sample rate.
+    - feature_set (str): "mfcc" or "full".
+    - n_mfcc (int): Number of MFCCs.
+
+    Returns:
+    - np.ndarray: (n_features,) for one clip, (n_clips, n_features) for a batch.
+    """
+    if feature_set not in FEATURE_SETS:
+        raise ValueError(f"Unknown feature set '{feature_set}'; expected one of {FEATURE_SETS}.")
+    audio = np.asarray(audio)
+    power, magnitude = spectrogram(audio)
+
+    mel = librosa.feature.melspectrogram(S=power, sr=sr)
+    mfccs = librosa.feature.mfcc(S=power_to_db(mel), n_mfcc=n_mfcc)
+    if feature_set == "mfcc":
+        return mfccs.mean(axis=-1)
+
+    # Chroma tuning and the spectral contrast dB floor are both taken from the whole input,
+    # so they are computed clip by clip: batching must never change a clip's features
+    clips_power = power.reshape((-1,) + power.shape[-2:])
+    clips_magnitude = magnitude.reshape((-1,) + magnitude.shape[-2:])
+    chroma = np.stack([
+        librosa.feature.chroma_stft(S=clip_power, sr=sr, tuning=librosa.estimate_tuning(S=clip_power, sr=sr, bins_per_octave=12))
+        for clip_power in clips_power
+    ]).reshape(power.shape[:-2] + (12, power.shape[-1]))
+    contrast = np.stack([
+        librosa.feature.spectral_contrast(S=clip_magnitude, sr=sr) for clip_magnitude in clips_magnitude
+    ])
+    contrast = contrast.reshape(magnitude.shape[:-2] + contrast.shape[-2:])
+
+    return np.concatenate(
+        (mfccs.mean(axis=-1), chroma.mean(axis=-1), mel.mean(axis=-1), contrast.mean(axis=-1)), axis=-1
+    )
+
+
+def extract_features_many(clips, sr, feature_set="full", n_mfcc=N_MFCC):
+    """
+    Extracts features for clips of any lengths, batching clips of equal length together.
+    Returns a (n_clips, n_features) array in input order.
+    """
+    clips = [np.asarray(clip) for clip in clips]
+    by_length = {}
+    for i, clip in enumerate(clips):
+        by_length.setdefault(len(clip), []).append(i)
+    rows = [None] * len(clips)
+    for indices in by_length.values():
+        features = extract_features(np.stack([clips[i] for i in indices]), sr, feature_set, n_mfcc)
+        for i, row in zip(indices, features):
+            rows[i] = row
+    return np.stack(rows)
@@ -0,0 +1,82 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item requests into batches for one worker thread.
+
+    Callers submit items and get a Future back. The worker waits for the first item,
+    then keeps collecting until either `max_batch_size` items are queued or
+    `max_wait_ms` has passed, and hands the whole batch to `process_batch`.
+    """
+
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=10, name="micro-batcher"):
+        """
+        Args:
+        - process_batch (callable): Takes a list of items and returns a list of results in the same order.
+        - max_batch_size (int): Largest batch passed to process_batch.
+        - max_wait_ms (float): Longest time the first item in a batch waits for company.
+        - name (str): Name of the worker thread.
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self._reset()
+        # Threads do not survive fork, so a forked child (e.g. a background job process) gets its own queue and worker
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._start_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, args=(self._queue,), name=self.name, daemon=True)
+
+    def submit(self, item):
+        """Queues one item and returns a Future resolving to its result."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_started(self):
+        if not self._worker.is_alive():
+            with self._start_lock:
+                if not self._worker.is_alive():
+                    self._worker.start()
+
+    def _collect_batch(self, pending):
+        batch = [pending.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, pending):
+        while True:
+            batch = self._collect_batch(pending)
+            # Skip callers that gave up before the batch ran
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = list(self.process_batch([item for item, _ in batch]))
+                # A short result list would leave some callers waiting forever
+                if len(results) != len(batch):
+                    raise ValueError(f"{self.name}: process_batch returned {len(results)} results for {len(batch)} items.")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,274 @@
+"""
+Offline bulk scoring of text, audio and video archives.
+
+Examples:
+    python -m src.bulk_score text messages.csv --text-field message --output text_scores.jsonl
+    python -m src.bulk_score audio recordings/ --output audio_scores.jsonl --workers 8
+    python -m src.bulk_score video clips/ --output video_scores --output-format parquet --resume
+
+Inputs are streamed and processed in chunks. After every chunk the results are flushed
+and a checkpoint (<output>.ckpt) records how many items are done, so --resume continues
+where an interrupted run stopped.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from src.emotions import EMOTION_LABELS
+from src import metrics
+
+AUDIO_EXTENSIONS = (".wav",)
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+
+# Readers: each yields (item_id, payload) in a deterministic order so checkpoints stay valid
+
+def read_texts(path, text_field="text", id_field=None):
+    """Streams texts from a CSV file (with a header row) or a JSONL file."""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f):
+                if line.strip():
+                    record = json.loads(line)
+                    yield record.get(id_field, line_number) if id_field else line_number, record[text_field]
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row_number, row in enumerate(csv.DictReader(f)):
+                yield row[id_field] if id_field else row_number, row[text_field]
+
+
+def read_files(path, extensions):
+    """Streams file paths with the given extensions from a file or a directory tree, in sorted order."""
+    if os.path.isfile(path):
+        yield path, path
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(extensions):
+                full_path = os.path.join(root, filename)
+                yield full_path, full_path
+
+
+# Writers
+
+class JsonlWriter:
+    def __init__(self, path, offset=0):
+        self._file = open(path, "a+", encoding="utf-8")
+        # Drop any records written after the last checkpoint so resumed runs never duplicate items
+        self._file.truncate(offset)
+        self._file.seek(offset)
+
+    def position(self):
+        return self._file.tell()
+
+    def write_chunk(self, records, chunk_index):
+        for record in records:
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """Writes each chunk as its own part file in the output directory, so resumed runs only append parts."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output requires the pyarrow package.")
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def position(self):
+        return 0
+
+    def write_chunk(self, records, chunk_index):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.Table.from_pylist(records), os.path.join(self.path, f"part-{chunk_index:06d}.parquet"))
+
+    def close(self):
+        pass
+
+
+# Checkpoints
+
+def _checkpoint_path(output):
+    return output.rstrip(os.sep) + ".ckpt"
+
+
+def load_checkpoint(output):
+    """Returns (items processed, chunks written, output byte offset) recorded for an output."""
+    try:
+        with open(_checkpoint_path(output), encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        return checkpoint["processed"], checkpoint["chunks"], checkpoint["offset"]
+    except FileNotFoundError:
+        return 0, 0, 0
+
+
+def save_checkpoint(output, processed, chunks, offset):
+    tmp_path = _checkpoint_path(output) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"processed": processed, "chunks": chunks, "offset": offset}, f)
+    os.replace(tmp_path, _checkpoint_path(output))
+
+
+# Scorers: take a chunk of (item_id, payload) and return one record per item
+
+def _record(item_id, label, scores, error=None):
+    record = {"id": item_id, "emotion": label}
+    record["scores"] = {name: float(score) for name, score in zip(EMOTION_LABELS, scores)} if scores is not None else None
+    if error:
+        record["error"] = error
+    return record
+
+
+def score_text_chunk(chunk, executor=None):
+    from src.text_detection import detect_text_emotion_batch
+    results = detect_text_emotion_batch([text for _, text in chunk], return_scores=True)
+    if results is None:
+        return [_record(item_id, None, None, "text detection failed") for item_id, _ in chunk]
+    return [_record(item_id, label, scores) for (item_id, _), (label, scores) in zip(chunk, results)]
+
+
+def _score_audio_file(path):
+    # Runs in a worker process; the voice model is loaded once per worker by the registry
+    from src.voice_detection import detect_voice_emotion
+    try:
+        label, scores = detect_voice_emotion(return_scores=True, audio=path)
+        return label, scores, None
+    except Exception as e:
+        return None, None, str(e)
+
+
+def _score_video_file(path):
+    from src.face_detection import detect_face_emotion
+    try:
+        label, scores = detect_face_emotion(duration=None, source=path, return_scores=True, target_fps=None, analyze_every=5)
+        return label, scores, None
+    except Exception as e:
+        return None, None, str(e)
+
+
+def _pool_scorer(score_file):
+    def score_chunk(chunk, executor):
+        results = executor.map(score_file, [path for _, path in chunk])
+        return [_record(item_id, label, scores, error) for (item_id, _), (label, scores, error) in zip(chunk, results)]
+    return score_chunk
+
+
+score_audio_chunk = _pool_scorer(_score_audio_file)
+score_video_chunk = _pool_scorer(_score_video_file)
+
+
+def run_bulk(items, score_chunk, output, output_format="jsonl", chunk_size=64, workers=None, resume=False, use_pool=True):
+    """
+    Scores a stream of items chunk by chunk, writing results and a checkpoint after each chunk.
+
+    Args:
+    - items (iterable): (item_id, payload) pairs in a deterministic order.
+    - score_chunk (callable): (chunk, executor) -> list of records.
+    - output (str): JSONL file or Parquet directory.
+    - output_format (str): "jsonl" or "parquet".
+    - chunk_size (int): Items per chunk (and per text batch).
+    - workers (int | None): Worker processes for file scoring. Defaults to the CPU count.
+    - resume (bool): Skip items already recorded in the checkpoint instead of starting over.
+    - use_pool (bool): Create a process pool for score_chunk.
+
+    Returns:
+    - int: Total number of items processed, including resumed ones.
+    """
+    processed, chunks, offset = load_checkpoint(output) if resume else (0, 0, 0)
+    if not resume:
+        if os.path.isdir(output):
+            for filename in os.listdir(output):
+                if filename.startswith("part-") and filename.endswith(".parquet"):
+                    os.remove(os.path.join(output, filename))
+        save_checkpoint(output, 0, 0, 0)
+    elif processed:
+        print(f"Resuming after {processed} items.")
+
+    items = iter(items)
+    for _ in islice(items, processed):
+        pass  # Already scored in a previous run
+
+    writer = ParquetWriter(output) if output_format == "parquet" else JsonlWriter(output, offset)
+    executor = ProcessPoolExecutor(max_workers=workers) if use_pool else None
+    start_time = time.perf_counter()
+    done_this_run = 0
+    try:
+        while True:
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                break
+            with metrics.span("bulk.chunk"):
+                records = score_chunk(chunk, executor)
+            metrics.increment("emotionix_bulk_items_total", len(chunk))
+            writer.write_chunk(records, chunks)
+            chunks += 1
+            processed += len(chunk)
+            done_this_run += len(chunk)
+            save_checkpoint(output, processed, chunks, writer.position())
+
+            elapsed = time.perf_counter() - start_time
+            print(f"Processed {processed} items ({done_this_run / elapsed:.1f} items/s)", flush=True)
+    finally:
+        writer.close()
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = time.perf_counter() - start_time
+    rate = done_this_run / elapsed if elapsed > 0 else 0.0
+    print(f"Finished: {processed} items, {done_this_run} this run in {elapsed:.1f}s ({rate:.1f} items/s).")
+    return processed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score text, audio or video archives offline.")
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+
+    text_parser = subparsers.add_parser("text", help="Score a CSV or JSONL file of texts.")
+    text_parser.add_argument("input", help="CSV (with header) or .jsonl file.")
+    text_parser.add_argument("--text-field", default="text", help="Column/key holding the text.")
+    text_parser.add_argument("--id-field", default=None, help="Column/key holding an item id (default: row number).")
+
+    audio_parser = subparsers.add_parser("audio", help="Score a WAV file or a directory of WAV files.")
+    audio_parser.add_argument("input")
+
+    video_parser = subparsers.add_parser("video", help="Score a video file or a directory of videos.")
+    video_parser.add_argument("input")
+
+    for sub in (text_parser, audio_parser, video_parser):
+        sub.add_argument("--output", required=True, help="Output .jsonl file, or directory for Parquet.")
+        sub.add_argument("--output-format", choices=("jsonl", "parquet"), default="jsonl")
+        sub.add_argument("--chunk-size", type=int, default=64, help="Items per batch and checkpoint.")
+        sub.add_argument("--workers", type=int, default=None, help="Worker processes for audio/video.")
+        sub.add_argument("--resume", action="store_true", help="Continue from the last checkpoint.")
+
+    args = parser.parse_args(argv)
+
+    if args.kind == "text":
+        items = read_texts(args.input, args.text_field, args.id_field)
+        score_chunk, use_pool = score_text_chunk, False
+    elif args.kind == "audio":
+        items = read_files(args.input, AUDIO_EXTENSIONS)
+        score_chunk, use_pool = score_audio_chunk, True
+    else:
+        items = read_files(args.input, VIDEO_EXTENSIONS)
+        score_chunk, use_pool = score_video_chunk, True
+
+    run_bulk(items, score_chunk, args.output, output_format=args.output_format, chunk_size=args.chunk_size,
+             workers=args.workers, resume=args.resume, use_pool=use_pool)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from src import metrics
+
+
+def approximate_size(value):
+    """Returns the approximate memory footprint in bytes of a value built from str, numbers, lists, tuples and dicts."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(approximate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(approximate_size(key) + approximate_size(item) for key, item in value.items())
+    return size
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with TTL expiry, single-flight computation and stale-while-revalidate.
+
+    - Entries younger than `ttl` are served directly.
+    - Entries older than `ttl` but younger than `ttl + stale_ttl` are served immediately
+      while one background thread recomputes them.
+    - On a miss, concurrent callers for the same key share a single computation.
+    - With `disk_path`, entries are also kept in a SQLite file that survives restarts and is
+      shared by every process pointing at it. Values must then be JSON-serializable.
+    - With `max_bytes`, least recently used entries are also evicted once the approximate
+      in-memory size of keys and values exceeds it.
+    """
+
+    def __init__(self, name, max_entries=256, ttl=3600, stale_ttl=0, disk_path=None, max_bytes=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.disk_path = disk_path
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._sizes = {}  # key -> approximate bytes, only tracked with max_bytes
+        self._bytes = 0
+        self.stats = Counter()
+        self._reset_locks()
+        # Locks held by another thread at fork time would never be released in the child
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_locks)
+        if disk_path:
+            with self._connect() as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+
+    def _count(self, event):
+        self.stats[event] += 1
+        metrics.increment("emotionix_cache_events_total", cache=self.name, event=event)
+
+    def _reset_locks(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future shared by every caller waiting on the computation
+
+    def _connect(self):
+        return sqlite3.connect(self.disk_path, timeout=5)
+
+    def _disk_get(self, key):
+        try:
+            with self._connect() as db:
+                row = db.execute("SELECT value, stored_at FROM cache WHERE key = ?", (key,)).fetchone()
+            return (json.loads(row[0]), row[1]) if row else None
+        except sqlite3.Error as e:
+            print(f"Warning: {self.name} cache disk read failed. Details: {e}")
+            return None
+
+    def _disk_set(self, key, value, stored_at):
+        try:
+            with self._connect() as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), stored_at),
+                )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Warning: {self.name} cache disk write failed. Details: {e}")
+
+    def _store(self, key, value, stored_at):
+        size = approximate_size(key) + approximate_size(value) if self.max_bytes else 0
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            if self.max_bytes:
+                self._bytes += size - self._sizes.get(key, 0)
+                self._sizes[key] = size
+            while len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1):
+                evicted, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted, 0)
+                self._count("evictions")
+
+    def _lookup(self, key):
+        """Returns (value, stored_at) from memory, then disk, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        if self.disk_path:
+            entry = self._disk_get(key)
+            if entry is not None:
+                self._count("disk_hits")
+                self._store(key, *entry)
+            return entry
+        return None
+
+    def _compute(self, key, compute, future):
+        try:
+            value = compute()
+        except Exception as e:
+            self._count("errors")
+            future.set_exception(e)
+        else:
+            stored_at = time.time()
+            self._store(key, value, stored_at)
+            if self.disk_path:
+                self._disk_set(key, value, stored_at)
+            future.set_result(value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _start_compute(self, key, compute):
+        """Returns (future, is_owner); only the owner runs the computation."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for `key`, calling `compute()` to fill or refresh it.
+        Exceptions from compute() reach every waiting caller and are not cached.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self._count("hits")
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._count("stale_hits")
+                future, is_owner = self._start_compute(key, compute)
+                if is_owner:
+                    threading.Thread(
+                        target=self._compute, args=(key, compute, future), name=f"{self.name}-refresh", daemon=True
+                    ).start()
+                return value
+
+        future, is_owner = self._start_compute(key, compute)
+        if is_owner:
+            self._count("misses")
+            self._compute(key, compute, future)
+        else:
+            # Served by another caller's computation, so this lookup cost no extra compute
+            self._count("coalesced")
+        return future.result()
+
+    def get(self, key):
+        """Returns the fresh cached value for `key`, or None. Counts a hit or a miss."""
+        entry = self._lookup(key)
+        if entry is not None and time.time() - entry[1] < self.ttl:
+            self._count("hits")
+            return entry[0]
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        """Stores a value computed outside get_or_compute (e.g. as part of a batch)."""
+        stored_at = time.time()
+        self._store(key, value, stored_at)
+        if self.disk_path:
+            self._disk_set(key, value, stored_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def metrics(self):
+        """
+        Returns hit/miss counters, the hit rate and the current number of entries.
+        Misses count computations; callers that waited on an in-flight computation are
+        counted as coalesced and, like hits, were served without computing.
+        """
+        with self._lock:
+            stats = dict(self.stats, size=len(self._entries))
+            if self.max_bytes:
+                stats["bytes"] = self._bytes
+        served = stats.get("hits", 0) + stats.get("stale_hits", 0) + stats.get("coalesced", 0)
+        lookups = served + stats.get("misses", 0)
+        stats["hit_rate"] = served / lookups if lookups else 0.0
+        return stats
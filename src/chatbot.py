@@ -1,26 +1,318 @@
-from transformers import BlenderbotTokenizer, BlenderbotForConditionalGeneration
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from src.model_registry import register_model, get_model
+from src.inference_backends import backend_from_env, load_seq2seq
+from src.generation_scheduler import GenerationScheduler
+from src import metrics
 
-# Initialize the model and tokenizer
+# Model used for chatbot responses; loaded on first use through the model registry
 model_name = "facebook/blenderbot-400M-distill"
-tokenizer = BlenderbotTokenizer.from_pretrained(model_name)
-model = BlenderbotForConditionalGeneration.from_pretrained(model_name)
+# "pytorch", "int8" (dynamic quantization) or "onnx" (ONNX Runtime); see src/inference_backends.py
+CHAT_BACKEND = backend_from_env("EMOTIONIX_CHAT_BACKEND")
 
-def chat_with_bot(input_text):
+# Token budget for the conversation context fed to the encoder. Older turns slide out of the window,
+# so per-turn cost stays flat however long a conversation gets (Blenderbot accepts at most 128 positions).
+CONTEXT_TOKENS = int(os.environ.get("EMOTIONIX_CHAT_CONTEXT_TOKENS", 120))
+# Turns kept per session; older ones could never fit in the window anyway
+MAX_TURNS = 64
+SESSION_TTL = 3600
+# Seconds stream_chat_with_bot waits for the next piece of text
+STREAM_TIMEOUT = 60
+# Seconds chat_with_bot waits for a reply from the shared scheduler
+REPLY_TIMEOUT = 120
+
+# With EMOTIONIX_CHAT_SCHEDULER=1, all chats in a process share one continuous-batching scheduler
+# instead of running a separate generate() each (PyTorch and int8 backends only)
+USE_SCHEDULER = os.environ.get("EMOTIONIX_CHAT_SCHEDULER") == "1" and CHAT_BACKEND != "onnx"
+SCHEDULER_BATCH_SIZE = int(os.environ.get("EMOTIONIX_CHAT_MAX_BATCH", 8))
+SCHEDULER_QUEUE_DEPTH = int(os.environ.get("EMOTIONIX_CHAT_QUEUE_DEPTH", 32))
+
+# Sampling settings for every reply. Anything not set here comes from the model's generation config,
+# in generate() and in the scheduler alike. Blenderbot's config asks for 10 beams, which the scheduler
+# cannot run, so plain sampling is set explicitly and both paths decode the same way.
+SAMPLING = dict(
+    max_length=100,
+    num_beams=1,
+    no_repeat_ngram_size=3,
+    top_k=50,
+    top_p=0.95,
+    temperature=0.7,
+    do_sample=True,
+)
+
+
+def _load_chatbot():
+    return load_seq2seq(model_name, CHAT_BACKEND)
+
+
+register_model("chatbot", _load_chatbot)
+
+
+def _load_scheduler():
+    _, model = get_model("chatbot")
+    return GenerationScheduler(
+        model, max_batch_size=SCHEDULER_BATCH_SIZE, max_queue_depth=SCHEDULER_QUEUE_DEPTH, name="chat-scheduler"
+    )
+
+
+register_model("chat_scheduler", _load_scheduler)
+
+
+class ConversationStore:
     """
-    Takes user input as text, generates a response using the chatbot model, and returns the response.
+    Server-side conversation history per session. Each turn is stored with its token ids,
+    so earlier messages are tokenized once rather than on every turn.
+
+    By default sessions live in an in-process LRU. Pass a `backend` with get/set(key, value, expire=...)
+    (e.g. a diskcache.Cache) to share sessions between processes, such as Dash background jobs.
     """
-    inputs = tokenizer(input_text, return_tensors="pt")
-    response_ids = model.generate(
-        **inputs,
-        max_length=100,
+
+    def __init__(self, backend=None, max_sessions=1000, ttl=SESSION_TTL):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._reset_lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Returns the list of turns ({"user": bool, "text": str, "ids": [int]}) for a session."""
+        if self.backend is not None:
+            return self.backend.get(f"chat:{session_id}", [])
+        with self._lock:
+            turns = self._sessions.get(session_id, [])
+            if session_id in self._sessions:
+                self._sessions.move_to_end(session_id)
+            return list(turns)
+
+    def set(self, session_id, turns):
+        turns = turns[-MAX_TURNS:]
+        if self.backend is not None:
+            self.backend.set(f"chat:{session_id}", turns, expire=self.ttl)
+            return
+        with self._lock:
+            self._sessions[session_id] = turns
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def clear(self, session_id):
+        if self.backend is not None:
+            self.backend.delete(f"chat:{session_id}")
+            return
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+conversation_store = ConversationStore()
+
+
+def _make_turn(tokenizer, text, is_user):
+    # Blenderbot was trained on turns separated by spaces, with user turns prefixed by one
+    text = f" {text}" if is_user else text
+    return {"user": is_user, "text": text.strip(), "ids": tokenizer(text, add_special_tokens=False)["input_ids"]}
+
+
+def build_context_ids(turns, budget, eos_token_id):
+    """
+    Returns the encoder input ids: the most recent turns that fit in `budget` tokens, followed by EOS.
+    If the latest turn alone is too long, only its last tokens are kept.
+    """
+    budget -= 1  # Room for EOS
+    window = []
+    used = 0
+    for turn in reversed(turns):
+        if used + len(turn["ids"]) > budget:
+            if not window:
+                window.append(turn["ids"][-budget:])
+            break
+        window.append(turn["ids"])
+        used += len(turn["ids"])
+    context = [token for ids in reversed(window) for token in ids]
+    return context + [eos_token_id]
+
+
+def _prepare_turn(input_text, session_id, store):
+    """Returns (tokenizer, model, store, turns including the new user turn, encoder input ids)."""
+    import torch
+
+    tokenizer, model = get_model("chatbot")
+    store = store or conversation_store
+    turns = store.get(session_id) if session_id is not None else []
+    turns.append(_make_turn(tokenizer, input_text, is_user=True))
+
+    budget = min(CONTEXT_TOKENS, tokenizer.model_max_length)
+    input_ids = torch.tensor([build_context_ids(turns, budget, tokenizer.eos_token_id)])
+    return tokenizer, model, store, turns, input_ids
+
+
+def _generation_kwargs(tokenizer, input_ids):
+    import torch
+
+    return dict(
+        input_ids=input_ids,
+        attention_mask=torch.ones_like(input_ids),
         pad_token_id=tokenizer.eos_token_id,
-        no_repeat_ngram_size=3,
-        top_k=50,
-        top_p=0.95,
-        temperature=0.7,
-        do_sample=True
+        use_cache=True,  # Reuse decoder key/values across generation steps
+        **SAMPLING,
     )
-    return tokenizer.decode(response_ids[0], skip_special_tokens=True)
+
+
+def _finish_turn(tokenizer, store, turns, session_id, response):
+    if session_id is not None:
+        turns.append(_make_turn(tokenizer, response, is_user=False))
+        store.set(session_id, turns)
+
+
+def chat_with_bot(input_text, session_id=None, store=None):
+    """
+    Takes user input as text, generates a response using the chatbot model, and returns the response.
+
+    With a session_id, the reply is conditioned on the session's recent turns (within CONTEXT_TOKENS)
+    and both messages are added to the session history.
+
+    :param input_text: The user's message.
+    :param session_id: Conversation to continue, or None for a single stateless exchange.
+    :param store: ConversationStore holding the sessions (defaults to the in-process store).
+    :return: The bot's reply.
+    """
+    import torch
+
+    tokenizer, model, store, turns, input_ids = _prepare_turn(input_text, session_id, store)
+    with metrics.span("chat.generate"):
+        if USE_SCHEDULER:
+            abandoned = threading.Event()
+            # Returning False takes the request out of the batch once the caller has given up
+            future = get_model("chat_scheduler").submit(
+                input_ids[0].tolist(), on_token=lambda token: not abandoned.is_set(), **SAMPLING
+            )
+            try:
+                response_ids = future.result(timeout=REPLY_TIMEOUT)
+            except FutureTimeoutError:
+                abandoned.set()
+                future.cancel()
+                raise
+        else:
+            with torch.inference_mode():
+                response_ids = model.generate(**_generation_kwargs(tokenizer, input_ids))[0]
+            # The scheduler counts its own tokens; skip the decoder start token like it does
+            metrics.increment("emotionix_chat_tokens_total", len(response_ids) - 1)
+    response = tokenizer.decode(response_ids, skip_special_tokens=True).strip()
+
+    _finish_turn(tokenizer, store, turns, session_id, response)
+    return response
+
+
+def _stream_with_generate(tokenizer, model, input_ids, timeout):
+    """Yields reply text from model.generate running on a worker thread."""
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+    stop_event = threading.Event()
+    errors = []
+
+    class StopWhenClosed(StoppingCriteria):
+        # Stops decoding when the consumer abandons the generator
+        def __call__(self, ids, scores, **kwargs):
+            return torch.full((ids.shape[0],), stop_event.is_set(), dtype=torch.bool)
+
+    def generate():
+        try:
+            with torch.inference_mode():
+                output = model.generate(
+                    **_generation_kwargs(tokenizer, input_ids),
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([StopWhenClosed()]),
+                )
+            metrics.increment("emotionix_chat_tokens_total", output.shape[-1] - 1)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()  # Unblock the consumer
+
+    worker = threading.Thread(target=generate, name="chatbot-stream", daemon=True)
+    worker.start()
+    try:
+        for piece in streamer:
+            if piece:
+                yield piece
+    finally:
+        stop_event.set()
+    worker.join()
+    if errors:
+        raise errors[0]
+
+
+def _stream_with_scheduler(tokenizer, input_ids, timeout):
+    """Yields reply text as the shared scheduler produces tokens for this request."""
+    tokens = queue.Queue()
+    stop_event = threading.Event()
+
+    def on_token(token):
+        tokens.put(token)
+        return not stop_event.is_set()  # Leave the batch when the consumer abandons the generator
+
+    future = get_model("chat_scheduler").submit(input_ids[0].tolist(), on_token=on_token, **SAMPLING)
+    future.add_done_callback(lambda _: tokens.put(None))
+    generated = []
+    emitted = 0
+    try:
+        while True:
+            token = tokens.get(timeout=timeout)
+            if token is None:
+                break
+            generated.append(token)
+            text = tokenizer.decode(generated, skip_special_tokens=True)
+            # Emit whole words only, like TextIteratorStreamer, so partial byte sequences never show
+            boundary = text.rfind(" ") + 1
+            if boundary > emitted:
+                yield text[emitted:boundary]
+                emitted = boundary
+    finally:
+        stop_event.set()
+    generated = future.result(timeout=timeout)  # Raises if generation failed
+    text = tokenizer.decode(generated, skip_special_tokens=True)
+    if len(text) > emitted:
+        yield text[emitted:]
+
+
+def stream_chat_with_bot(input_text, session_id=None, store=None, timeout=STREAM_TIMEOUT):
+    """
+    Like chat_with_bot, but yields the reply as it is decoded, so the first words can be shown
+    right away. Text comes from a TextIteratorStreamer fed by generate() on a worker thread,
+    or from the shared scheduler when USE_SCHEDULER is set.
+    The session history is updated once the reply is complete.
+
+    :param input_text: The user's message.
+    :param session_id: Conversation to continue, or None for a single stateless exchange.
+    :param store: ConversationStore holding the sessions (defaults to the in-process store).
+    :param timeout: Seconds to wait for the next piece of text before giving up.
+    :return: Generator of text pieces that concatenate to the reply.
+    """
+    tokenizer, model, store, turns, input_ids = _prepare_turn(input_text, session_id, store)
+    if USE_SCHEDULER:
+        pieces_stream = _stream_with_scheduler(tokenizer, input_ids, timeout)
+    else:
+        pieces_stream = _stream_with_generate(tokenizer, model, input_ids, timeout)
+
+    pieces = []
+    start_time = time.perf_counter()
+    with metrics.span("chat.stream"):
+        for piece in pieces_stream:
+            if not pieces:
+                metrics.observe(metrics.STAGE_METRIC, time.perf_counter() - start_time, stage="chat.first_token")
+            pieces.append(piece)
+            yield piece
+
+    _finish_turn(tokenizer, store, turns, session_id, "".join(pieces).strip())
 
 if __name__ == "__main__":
     import sys
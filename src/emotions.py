@@ -0,0 +1,88 @@
+from enum import Enum
+import numpy as np
+
+
+class Emotion(str, Enum):
+    """Canonical emotion labels shared by every detector, recommendation and feedback lookup."""
+    NEUTRAL = "neutral"
+    CALM = "calm"
+    HAPPY = "happy"
+    SAD = "sad"
+    ANGRY = "angry"
+    FEARFUL = "fearful"
+    DISGUST = "disgust"
+    SURPRISED = "surprised"
+    OPTIMISM = "optimism"
+
+
+# Shared emotion vocabulary. Every score vector returned by the detectors is ordered like this tuple.
+EMOTION_LABELS = tuple(emotion.value for emotion in Emotion)
+EMOTION_INDEX = {label: i for i, label in enumerate(EMOTION_LABELS)}
+
+# Raw labels emitted by each model
+TEXT_MODEL_LABELS = ("anger", "joy", "optimism", "sadness")
+FACE_MODEL_LABELS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+VOICE_MODEL_LABELS = ("neutral", "calm", "happy", "sad", "angry", "fearful", "disgust", "surprised")
+
+# Model labels and user-facing words that mean a canonical emotion
+EMOTION_SYNONYMS = {
+    Emotion.NEUTRAL: (),
+    Emotion.CALM: ("relaxed",),
+    Emotion.HAPPY: ("joy", "excited"),
+    Emotion.SAD: ("sadness", "lonely"),
+    Emotion.ANGRY: ("anger",),
+    Emotion.FEARFUL: ("fear",),
+    Emotion.DISGUST: (),
+    Emotion.SURPRISED: ("surprise",),
+    Emotion.OPTIMISM: (),
+}
+
+# Lower-case label -> Emotion, precomputed so every normalization is a single dict lookup
+_SYNONYM_INDEX = {emotion.value: emotion for emotion in Emotion}
+_SYNONYM_INDEX.update({synonym: emotion for emotion, synonyms in EMOTION_SYNONYMS.items() for synonym in synonyms})
+
+
+def normalize_emotion(label):
+    """
+    Returns the canonical Emotion for a model label or synonym in any case, or None if unknown.
+    """
+    if label is None:
+        return None
+    emotion = _SYNONYM_INDEX.get(label)
+    if emotion is None:
+        emotion = _SYNONYM_INDEX.get(str(label).strip().lower())
+    return emotion
+
+
+def canonical_label(label):
+    """Returns the canonical label string for a model label, or the label unchanged if it is unknown."""
+    emotion = normalize_emotion(label)
+    return emotion.value if emotion is not None else label
+
+
+def vocabulary_index(label):
+    """Returns the position of a model label in EMOTION_LABELS, or None if it has no counterpart."""
+    emotion = normalize_emotion(label)
+    return EMOTION_INDEX[emotion.value] if emotion is not None else None
+
+
+def to_score_vector(scores):
+    """
+    Converts a {model_label: score} mapping into a normalized float32 vector over EMOTION_LABELS.
+    Scores of labels that share a vocabulary entry are summed; unknown labels are dropped.
+    """
+    vector = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+    for label, score in scores.items():
+        index = vocabulary_index(label)
+        if index is not None:
+            vector[index] += score
+    total = vector.sum()
+    if total > 0:
+        vector /= total
+    return vector
+
+
+def top_k_emotions(scores, k=3):
+    """Returns the k highest scoring (label, score) pairs from a score vector."""
+    order = np.argsort(scores)[::-1][:k]
+    return [(EMOTION_LABELS[i], float(scores[i])) for i in order]
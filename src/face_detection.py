@@ -1,56 +1,330 @@
 import cv2
-from deepface import DeepFace
+import numpy as np
 import time
 from collections import Counter
+from contextlib import closing
+from src.model_registry import register_model, get_model
+from src import metrics
+from src.emotions import EMOTION_LABELS, canonical_label, to_score_vector
 
-def detect_face_emotion(duration=5):
+# Frames are downscaled to this size before face detection
+ANALYSIS_SIZE = (320, 240)
+# Face crops are resized to this size so they can be stacked into one emotion batch
+CROP_SIZE = (224, 224)
+# Extra border kept around the tracked face box, as a fraction of its size
+CROP_MARGIN = 0.2
+# Adaptive mode stops once at least ADAPTIVE_MIN_FRAMES frames are analyzed and the leading
+# emotion's lead over the runner-up is ADAPTIVE_Z standard errors above zero
+ADAPTIVE_MIN_FRAMES = 8
+ADAPTIVE_Z = 3.0
+
+
+def _load_deepface():
+    # Importing DeepFace pulls in TensorFlow, so it is deferred until the first video request
+    from deepface import DeepFace
+    return DeepFace
+
+
+register_model("deepface", _load_deepface)
+
+
+def open_frame_source(source):
+    """Returns a capture object for a camera index, a video file path, or an existing capture-like object."""
+    if isinstance(source, (int, str)):
+        return cv2.VideoCapture(source)
+    return source
+
+
+class FaceEmotionAnalyzer:
+    """
+    Runs the face emotion stages on individual frames and keeps per-stage timings.
+
+    Face detection runs once and its box is reused for the following frames, so only the
+    cheap emotion model runs per frame; the face is re-detected every `redetect_every`
+    analyzed frames or when the previous detection found nothing.
+    """
+
+    def __init__(self, detector_backend="opencv", redetect_every=10, analysis_size=ANALYSIS_SIZE):
+        self.DeepFace = get_model("deepface")
+        self.detector_backend = detector_backend
+        self.redetect_every = redetect_every
+        self.analysis_size = analysis_size
+        self.box = None
+        self.frames_since_detection = 0
+        self.stage_seconds = Counter()
+        self.stage_calls = Counter()
+
+    def _timed(self, stage, start_time):
+        elapsed = time.perf_counter() - start_time
+        self.stage_seconds[stage] += elapsed
+        self.stage_calls[stage] += 1
+        # Per-frame stages go to the histograms only; a trace would get one span per frame
+        metrics.observe(metrics.STAGE_METRIC, elapsed, stage=f"face.{stage}")
+
+    def preprocess(self, frame):
+        """Downscales a BGR camera frame and converts it to RGB."""
+        start_time = time.perf_counter()
+        resized_frame = cv2.resize(frame, self.analysis_size)
+        rgb_frame = cv2.cvtColor(resized_frame, cv2.COLOR_BGR2RGB)  # Convert BGR to RGB
+        self._timed("preprocess", start_time)
+        return rgb_frame
+
+    def _detect(self, rgb_frame):
+        start_time = time.perf_counter()
+        faces = self.DeepFace.extract_faces(rgb_frame, detector_backend=self.detector_backend, enforce_detection=False)
+        self._timed("detect", start_time)
+        # With enforce_detection=False a frame without faces comes back as one zero-confidence "face"
+        faces = [face for face in faces if face.get("confidence", 0) > 0]
+        if not faces:
+            return None
+        area = max(faces, key=lambda face: face["facial_area"]["w"] * face["facial_area"]["h"])["facial_area"]
+        x, y, w, h = area["x"], area["y"], area["w"], area["h"]
+        pad_x, pad_y = int(w * CROP_MARGIN), int(h * CROP_MARGIN)
+        height, width = rgb_frame.shape[:2]
+        return max(0, x - pad_x), max(0, y - pad_y), min(width, x + w + pad_x), min(height, y + h + pad_y)
+
+    def crop(self, rgb_frame):
+        """Returns the tracked face crop resized to CROP_SIZE, re-detecting the face when due."""
+        if self.box is None or self.frames_since_detection >= self.redetect_every:
+            self.box = self._detect(rgb_frame)
+            self.frames_since_detection = 0
+        self.frames_since_detection += 1
+
+        if self.box is None:
+            face = rgb_frame  # No face found; analyze the whole frame like enforce_detection=False does
+            self.frames_since_detection = self.redetect_every  # Try detecting again on the next frame
+        else:
+            x1, y1, x2, y2 = self.box
+            face = rgb_frame[y1:y2, x1:x2]
+        return cv2.resize(face, CROP_SIZE)
+
+    def analyze(self, crops):
+        """
+        Runs the emotion model on a batch of crops without re-detecting faces.
+        Returns one DeepFace result dict (with 'dominant_emotion' and 'emotion') per crop.
+        """
+        if not crops:
+            return []
+        start_time = time.perf_counter()
+        try:
+            results = self.DeepFace.analyze(
+                np.stack(crops), actions=["emotion"], detector_backend="skip", enforce_detection=False, silent=True
+            )
+            # Batched input returns one list of faces per image
+            results = [result[0] if isinstance(result, list) else result for result in results]
+            if len(results) != len(crops):
+                raise ValueError("Batched analysis returned an unexpected number of results.")
+        except Exception:
+            # Older DeepFace releases only accept one image per call
+            results = [
+                self.DeepFace.analyze(crop, actions=["emotion"], detector_backend="skip", enforce_detection=False, silent=True)[0]
+                for crop in crops
+            ]
+        self._timed("emotion", start_time)
+        return results
+
+    def latency_ms(self):
+        """Returns the mean latency per call of each stage in milliseconds."""
+        return {stage: 1000 * self.stage_seconds[stage] / self.stage_calls[stage] for stage in self.stage_calls}
+
+
+def margin_is_stable(frame_scores, min_frames=ADAPTIVE_MIN_FRAMES, z_threshold=ADAPTIVE_Z):
+    """
+    Tests whether the leading emotion of the mean scores so far is a stable result.
+
+    Takes, for every analyzed frame, the score of the leading emotion minus that of the
+    runner-up, and runs a one-sided z-test on their mean. The test is repeated as frames
+    arrive, so min_frames and a strict z_threshold guard against stopping on an early fluke.
+
+    Args:
+    - frame_scores (list[np.ndarray]): Per-frame score vectors ordered like EMOTION_LABELS.
+    - min_frames (int): Never stop before this many frames.
+    - z_threshold (float): Required mean difference in standard errors.
+
+    Returns:
+    - bool: True when the lead is significant.
+    """
+    if len(frame_scores) < max(min_frames, 2):
+        return False
+    scores = np.asarray(frame_scores)
+    runner_up, leader = np.argsort(scores.mean(axis=0))[-2:]
+    differences = scores[:, leader] - scores[:, runner_up]
+    spread = differences.std(ddof=1)
+    if spread == 0:
+        return bool(differences[0] > 0)  # Every frame agrees exactly
+    return bool(differences.mean() / (spread / np.sqrt(len(differences))) >= z_threshold)
+
+
+# face.detect is the per-frame detector stage; this is the whole call
+@metrics.timed("face.total")
+def detect_face_emotion(duration=5, return_scores=False, source=0, analyze_every=1, target_fps=None,
+                        batch_size=4, redetect_every=10, detector_backend="opencv", return_stats=False,
+                        pipelined=False, workers=1, adaptive=False, max_frames=None,
+                        min_frames=ADAPTIVE_MIN_FRAMES, z_threshold=ADAPTIVE_Z):
     """
     Detect the dominant emotion from live video feed over a specified duration.
-    
+
     Args:
-    - duration (int): Duration in seconds to analyze video feed.
-    
+    - duration (int): Duration in seconds to analyze video feed. None reads a video file to the end.
+    - return_scores (bool): Also return the per-frame emotion scores averaged over
+      the analyzed frames, as a vector ordered like src.emotions.EMOTION_LABELS.
+    - source (int | str | object): Camera index or video file path passed to cv2.VideoCapture,
+      or a capture-like object with isOpened()/read()/release().
+    - analyze_every (int): Analyze every Nth captured frame.
+    - target_fps (float | None): Analyze at most this many frames per second; overrides analyze_every.
+    - batch_size (int): Number of face crops sent to the emotion model at once.
+    - redetect_every (int): Re-run face detection after this many analyzed frames.
+    - detector_backend (str): DeepFace face detector used for the tracked box.
+    - return_stats (bool): Also return a dict with frames captured vs analyzed and
+      the mean latency of each stage (capture, preprocess, detect, emotion) in ms.
+    - pipelined (bool): Capture on its own thread and analyze the newest frame on `workers`
+      inference threads (src/frame_pipeline.py). analyze_every, target_fps and batch_size
+      do not apply, since workers always take the newest frame when they become free.
+    - workers (int): Number of inference threads in pipelined mode.
+    - adaptive (bool): Stop as soon as margin_is_stable() accepts the scores so far, rather than
+      always using the whole duration. The label is then the emotion with the highest mean score.
+    - max_frames (int | None): Stop after analyzing this many frames.
+    - min_frames, z_threshold (int, float): Stopping rule of adaptive mode, see margin_is_stable().
+
     Returns:
     - str: The most commonly detected emotion or None if no emotion is detected.
+      With return_scores and/or return_stats, a tuple (label, [scores], [stats]).
+      Stats include elapsed_seconds, frames_analyzed and stop_reason ("converged",
+      "frame_budget", "duration" or "end_of_source").
     """
-    cap = cv2.VideoCapture(0)  # Start video capture from the default camera
+    def _result(label, scores, stats):
+        extras = ([scores] if return_scores else []) + ([stats] if return_stats else [])
+        return (label, *extras) if extras else label
+
+    if pipelined:
+        return _result(*_detect_face_emotion_pipelined(duration, source, workers, redetect_every, detector_backend,
+                                                       adaptive, max_frames, min_frames, z_threshold))
+
+    cap = open_frame_source(source)  # Start video capture from the camera or video file
     if not cap.isOpened():
         print("Error: Unable to access the camera.")
-        return None
+        return _result(None, None, None)
 
+    analyzer = FaceEmotionAnalyzer(detector_backend=detector_backend, redetect_every=redetect_every)
     emotion_results = []  # Store detected emotions
-    frame_count = 0  # Keep track of analyzed frames
+    score_sum = np.zeros(len(EMOTION_LABELS), dtype=np.float32)  # Running sum of per-frame scores
+    frame_scores = []  # Per-frame scores, kept for the adaptive stopping rule
+    frames_captured = 0
+    stop_reason = None
+    pending_crops = []
+    capture_seconds = 0.0
+    last_analysis_time = None
+
+    def _analyze_pending():
+        try:
+            for analysis in analyzer.analyze(pending_crops):
+                emotion_results.append(canonical_label(analysis['dominant_emotion']))  # Append to results
+                scores = to_score_vector(analysis['emotion'])
+                score_sum[:] += scores
+                if adaptive:
+                    frame_scores.append(scores)
+        except Exception as e:
+            print(f"Warning: Error analyzing frames. Skipping. Details: {e}")
+        pending_crops.clear()
 
     # Initialize the timer
     start_time = time.time()
-    while time.time() - start_time < duration:
+    while duration is None or time.time() - start_time < duration:
+        capture_start = time.perf_counter()
         ret, frame = cap.read()
+        capture_elapsed = time.perf_counter() - capture_start
+        capture_seconds += capture_elapsed
+        metrics.observe(metrics.STAGE_METRIC, capture_elapsed, stage="face.capture")
         if not ret:
-            print("Error: Failed to capture frame.")
+            if duration is not None:
+                print("Error: Failed to capture frame.")
+            stop_reason = "end_of_source"
             break
+        frames_captured += 1
 
-        # Preprocess frame to improve detection accuracy
-        resized_frame = cv2.resize(frame, (640, 480))  # Resize to a standard resolution
-        rgb_frame = cv2.cvtColor(resized_frame, cv2.COLOR_BGR2RGB)  # Convert BGR to RGB
+        # Decide whether this frame is due for analysis
+        now = time.time()
+        if target_fps:
+            if last_analysis_time is not None and now - last_analysis_time < 1.0 / target_fps:
+                continue
+        elif (frames_captured - 1) % analyze_every:
+            continue
+        last_analysis_time = now
 
         try:
-            # Analyze the current frame for emotions
-            analysis = DeepFace.analyze(rgb_frame, actions=["emotion"], enforce_detection=False)
-            dominant_emotion = analysis[0]['dominant_emotion']  # Get the dominant emotion
-            emotion_results.append(dominant_emotion)  # Append to results
-            frame_count += 1
+            pending_crops.append(analyzer.crop(analyzer.preprocess(frame)))
         except Exception as e:
-            print(f"Warning: Error analyzing frame. Skipping. Details: {e}")
+            print(f"Warning: Error detecting face. Skipping. Details: {e}")
+        if len(pending_crops) >= batch_size:
+            _analyze_pending()
+            if adaptive and margin_is_stable(frame_scores, min_frames, z_threshold):
+                stop_reason = "converged"
+                break
+        if max_frames is not None and len(emotion_results) + len(pending_crops) >= max_frames:
+            stop_reason = "frame_budget"
+            break
+    _analyze_pending()
 
-    # Release resources
+    # Release resources (no windows are opened, so headless OpenCV builds work too)
     cap.release()
-    cv2.destroyAllWindows()
+
+    stats = {
+        "frames_captured": frames_captured,
+        "frames_analyzed": len(emotion_results),
+        "elapsed_seconds": time.time() - start_time,
+        "stop_reason": stop_reason or "duration",
+        "latency_ms": {"capture": 1000 * capture_seconds / max(frames_captured, 1), **analyzer.latency_ms()},
+    }
 
     # Determine the most common emotion if any were detected
     if emotion_results:
-        common_emotion = Counter(emotion_results).most_common(1)[0][0]
-        print(f"Frames Analyzed: {frame_count}, Detected Emotion: {common_emotion}")
-        return common_emotion
+        if adaptive:
+            common_emotion = EMOTION_LABELS[int(np.argmax(score_sum))]
+        else:
+            common_emotion = Counter(emotion_results).most_common(1)[0][0]
+        print(f"Frames Captured: {frames_captured}, Frames Analyzed: {len(emotion_results)}, Detected Emotion: {common_emotion}")
+        return _result(common_emotion, score_sum / len(emotion_results), stats)
+
+    print("No emotions detected.")
+    return _result(None, None, stats)
+
+
+def _detect_face_emotion_pipelined(duration, source, workers, redetect_every, detector_backend,
+                                   adaptive=False, max_frames=None, min_frames=ADAPTIVE_MIN_FRAMES, z_threshold=ADAPTIVE_Z):
+    """Aggregates the per-frame stream from src.frame_pipeline into (label, scores, stats)."""
+    from src.frame_pipeline import stream_face_emotions
+
+    stats = {}
+    emotion_results = []
+    score_sum = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+    frame_scores = []
+    stop_reason = None
+    start_time = time.time()
+    stream = stream_face_emotions(source, duration=duration, workers=workers, stats=stats,
+                                  redetect_every=redetect_every, detector_backend=detector_backend)
+    # Closing the stream on an early stop ends its capture and inference threads and fills in stats
+    with closing(stream):
+        for result in stream:
+            emotion_results.append(result["emotion"])
+            score_sum += result["scores"]
+            if adaptive:
+                frame_scores.append(result["scores"])
+                if margin_is_stable(frame_scores, min_frames, z_threshold):
+                    stop_reason = "converged"
+                    break
+            if max_frames is not None and len(emotion_results) >= max_frames:
+                stop_reason = "frame_budget"
+                break
+    stats.setdefault("elapsed_seconds", time.time() - start_time)
+    stats["stop_reason"] = stop_reason or ("duration" if duration is not None else "end_of_source")
+
+    if emotion_results:
+        if adaptive:
+            common_emotion = EMOTION_LABELS[int(np.argmax(score_sum))]
+        else:
+            common_emotion = Counter(emotion_results).most_common(1)[0][0]
+        print(f"Frames Captured: {stats['frames_captured']}, Frames Analyzed: {len(emotion_results)}, Detected Emotion: {common_emotion}")
+        return common_emotion, score_sum / len(emotion_results), stats
 
     print("No emotions detected.")
-    return None
\ No newline at end of file
+    return None, None, stats
@@ -0,0 +1,134 @@
+import json
+import os
+import numpy as np
+
+# Files making up a feature store directory
+FEATURES_FILE = "features.f32"
+COLUMNS_FILE = "columns.jsonl"
+META_FILE = "meta.json"
+COLUMN_NAMES = ("label", "actor", "source")
+
+
+class FeatureStoreWriter:
+    """
+    Writes a feature store incrementally: a raw float32 row-major matrix plus
+    label/actor/source columns. Rows are appended in chunks, so memory stays flat
+    regardless of how many clips are extracted.
+
+    The store only becomes readable once close() has written meta.json. If writing fails,
+    discard() (or leaving a `with` block with an exception) closes the files and removes
+    the partial store.
+    """
+
+    def __init__(self, path, n_features, metadata=None):
+        """
+        Args:
+        - path (str): Directory to create the store in. Existing store files are overwritten.
+        - n_features (int): Width of every feature row.
+        - metadata (dict | None): Extra JSON-serializable information (feature set, sample rate, ...).
+        """
+        self.path = path
+        self.n_features = n_features
+        self.metadata = metadata or {}
+        self.n_rows = 0
+        self.closed = False
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        self._features = open(os.path.join(path, FEATURES_FILE), "wb")
+        self._columns = open(os.path.join(path, COLUMNS_FILE), "w", encoding="utf-8")
+
+    def append(self, features, labels, actors=None, sources=None):
+        """
+        Appends a chunk of rows.
+
+        Args:
+        - features (array-like): Array of shape (n_rows, n_features).
+        - labels (list[str]): Emotion label per row.
+        - actors (list[str] | None): Speaker/actor id per row.
+        - sources (list[str] | None): Source file per row.
+        """
+        features = np.ascontiguousarray(features, dtype=np.float32).reshape(-1, self.n_features)
+        n = len(features)
+        if len(labels) != n:
+            raise ValueError(f"Got {n} feature rows but {len(labels)} labels.")
+        actors = actors if actors is not None else [""] * n
+        sources = sources if sources is not None else [""] * n
+
+        self._features.write(features.tobytes())
+        for row in zip(labels, actors, sources):
+            self._columns.write(json.dumps([str(value) for value in row]) + "\n")
+        self.n_rows += n
+
+    def close(self):
+        """Flushes the matrix, converts the columns to .npy files and writes meta.json."""
+        self._features.close()
+        self._columns.close()
+
+        columns = {name: [] for name in COLUMN_NAMES}
+        with open(os.path.join(self.path, COLUMNS_FILE), encoding="utf-8") as f:
+            for line in f:
+                for name, value in zip(COLUMN_NAMES, json.loads(line)):
+                    columns[name].append(value)
+        for name, values in columns.items():
+            np.save(os.path.join(self.path, f"{name}s.npy"), np.array(values, dtype=str))
+        os.remove(os.path.join(self.path, COLUMNS_FILE))
+
+        meta = {"n_rows": self.n_rows, "n_features": self.n_features, "dtype": "float32", "metadata": self.metadata}
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        self.closed = True
+
+    def discard(self):
+        """Closes the files and removes everything written so far, leaving no partial store behind."""
+        self._features.close()
+        self._columns.close()
+        for filename in (FEATURES_FILE, COLUMNS_FILE, META_FILE) + tuple(f"{name}s.npy" for name in COLUMN_NAMES):
+            path = os.path.join(self.path, filename)
+            if os.path.exists(path):
+                os.remove(path)
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif not self.closed:
+            self.discard()
+
+
+class FeatureStore:
+    """
+    Read-only view of a feature store. `features` is a memory-mapped (n_rows, n_features)
+    float32 matrix and the columns are memory-mapped too, so opening a store copies nothing.
+    """
+
+    def __init__(self, path):
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"No complete feature store at {path}.")
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.path = path
+        self.metadata = meta["metadata"]
+        shape = (meta["n_rows"], meta["n_features"])
+        if meta["n_rows"]:
+            self.features = np.memmap(os.path.join(path, FEATURES_FILE), dtype=meta["dtype"], mode="r", shape=shape)
+        else:
+            self.features = np.empty(shape, dtype=meta["dtype"])
+        mmap_mode = "r" if meta["n_rows"] else None  # Empty arrays cannot be memory-mapped
+        self.labels = np.load(os.path.join(path, "labels.npy"), mmap_mode=mmap_mode)
+        self.actors = np.load(os.path.join(path, "actors.npy"), mmap_mode=mmap_mode)
+        self.sources = np.load(os.path.join(path, "sources.npy"), mmap_mode=mmap_mode)
+
+    def __len__(self):
+        return len(self.features)
+
+
+def open_feature_store(path):
+    """Opens a feature store written by FeatureStoreWriter."""
+    return FeatureStore(path)
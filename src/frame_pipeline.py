@@ -0,0 +1,231 @@
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from src.emotions import canonical_label, to_score_vector
+from src.face_detection import FaceEmotionAnalyzer, open_frame_source
+
+# Frames are stored in the buffer at this (width, height)
+FRAME_SIZE = (640, 480)
+
+
+class LatestFrameBuffer:
+    """
+    Bounded frame buffer where the newest frame always wins.
+
+    Frames are copied into preallocated NumPy slots, so capture never allocates. Readers
+    check a slot out, and the writer only reuses slots nobody holds, so a frame is never
+    overwritten while it is being analyzed. Frames that no reader picked up before a newer
+    one arrived are dropped and counted.
+    """
+
+    def __init__(self, frame_size=FRAME_SIZE, slots=3):
+        width, height = frame_size
+        self.frame_size = frame_size
+        self._slots = [np.zeros((height, width, 3), dtype=np.uint8) for _ in range(slots)]
+        self._holders = [0] * slots
+        self._latest = None  # (sequence number, slot index) of the newest unread frame
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self.closed = False
+        self.frames_written = 0
+        self.frames_dropped = 0
+
+    def write(self, frame):
+        """Copies a frame into a free slot and publishes it, replacing any unread frame."""
+        with self._condition:
+            latest_slot = self._latest[1] if self._latest else None
+            free = [i for i, holders in enumerate(self._holders) if holders == 0 and i != latest_slot]
+            if not free:
+                # Every slot is being read; drop this frame rather than block the camera
+                self.frames_dropped += 1
+                return False
+            slot = free[0]
+
+        # Resize straight into the preallocated slot
+        if frame.shape[1::-1] == self.frame_size:
+            np.copyto(self._slots[slot], frame)
+        else:
+            cv2.resize(frame, self.frame_size, dst=self._slots[slot])
+
+        with self._condition:
+            if self._latest is not None:
+                self.frames_dropped += 1  # The previous frame was never read
+            self._sequence += 1
+            self._latest = (self._sequence, slot)
+            self.frames_written += 1
+            self._condition.notify()
+        return True
+
+    def acquire(self, timeout=None):
+        """
+        Waits for the newest unread frame and checks its slot out.
+        Returns (sequence, slot, frame), or None once the buffer is closed and drained or on timeout.
+        Call release(slot) when done with the frame.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._latest is not None or self.closed, timeout):
+                return None
+            if self._latest is None:
+                return None
+            sequence, slot = self._latest
+            self._latest = None
+            self._holders[slot] += 1
+            return sequence, slot, self._slots[slot]
+
+    def release(self, slot):
+        with self._condition:
+            self._holders[slot] -= 1
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class SyntheticFrameSource:
+    """
+    Stand-in for cv2.VideoCapture that produces generated frames, for tests and benchmarks.
+    Frames are a moving gradient, optionally paced at `fps`.
+    """
+
+    def __init__(self, n_frames=150, frame_size=FRAME_SIZE, fps=None):
+        self.n_frames = n_frames
+        self.frame_size = frame_size
+        self.fps = fps
+        self._index = 0
+        width, height = frame_size
+        self._base = np.add.outer(np.arange(height), np.arange(width)).astype(np.uint8)
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self._index >= self.n_frames:
+            return False, None
+        if self.fps:
+            time.sleep(1.0 / self.fps)
+        shifted = self._base + np.uint8(self._index % 256)
+        self._index += 1
+        return True, np.dstack([shifted, shifted, shifted])
+
+    def release(self):
+        pass
+
+
+def _capture_loop(capture, buffer, stop_event, stats):
+    try:
+        while not stop_event.is_set():
+            start_time = time.perf_counter()
+            ret, frame = capture.read()
+            if not ret:
+                break
+            stats["capture_seconds"] += time.perf_counter() - start_time
+            stats["frames_captured"] += 1
+            buffer.write(frame)
+    finally:
+        capture.release()
+        buffer.close()
+
+
+def _inference_loop(buffer, results, analyzer_kwargs):
+    analyzer = FaceEmotionAnalyzer(**analyzer_kwargs)
+    while True:
+        item = buffer.acquire(timeout=0.5)
+        if item is None:
+            if buffer.closed:
+                break
+            continue
+        sequence, slot, frame = item
+        try:
+            crop = analyzer.crop(analyzer.preprocess(frame))
+        except Exception as e:
+            print(f"Warning: Error detecting face. Skipping. Details: {e}")
+            continue
+        finally:
+            buffer.release(slot)
+        try:
+            analysis = analyzer.analyze([crop])[0]
+            results.put({
+                "sequence": sequence,
+                "timestamp": time.time(),
+                "emotion": canonical_label(analysis["dominant_emotion"]),
+                "scores": to_score_vector(analysis["emotion"]),
+            })
+        except Exception as e:
+            print(f"Warning: Error analyzing frame. Skipping. Details: {e}")
+    results.put(None)
+
+
+def stream_face_emotions(source=0, duration=5, workers=1, frame_size=FRAME_SIZE, stats=None, **analyzer_kwargs):
+    """
+    Streams per-frame face emotions with capture and inference on separate threads.
+
+    A capture thread keeps writing the newest camera frame into a LatestFrameBuffer while
+    `workers` inference threads analyze whatever frame is newest when they become free,
+    so slow inference drops stale frames instead of letting the capture buffer age.
+
+    Args:
+    - source (int | str | object): Camera index, video file path, or a capture-like object
+      with read()/release() such as SyntheticFrameSource.
+    - duration (float | None): Stop after this many seconds; None runs until the source ends.
+    - workers (int): Number of inference threads.
+    - frame_size (tuple): (width, height) frames are stored at.
+    - stats (dict | None): Filled with frames captured/analyzed/dropped counts when the stream ends.
+    - analyzer_kwargs: Passed to FaceEmotionAnalyzer (detector_backend, redetect_every, ...).
+
+    Yields:
+    - dict: sequence number, timestamp, dominant emotion and score vector for each analyzed frame.
+    """
+    capture = open_frame_source(source)
+    if not capture.isOpened():
+        print("Error: Unable to access the camera.")
+        return
+
+    buffer = LatestFrameBuffer(frame_size=frame_size, slots=workers + 2)
+    results = queue.Queue()
+    stop_event = threading.Event()
+    capture_stats = {"frames_captured": 0, "capture_seconds": 0.0}
+
+    capture_thread = threading.Thread(
+        target=_capture_loop, args=(capture, buffer, stop_event, capture_stats), name="frame-capture", daemon=True
+    )
+    worker_threads = [
+        threading.Thread(target=_inference_loop, args=(buffer, results, analyzer_kwargs), name=f"face-inference-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    capture_thread.start()
+    for thread in worker_threads:
+        thread.start()
+
+    start_time = time.time()
+    frames_analyzed = 0
+    finished_workers = 0
+    try:
+        while finished_workers < workers:
+            remaining = None if duration is None else duration - (time.time() - start_time)
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                result = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if result is None:
+                finished_workers += 1
+                continue
+            frames_analyzed += 1
+            yield result
+    finally:
+        stop_event.set()
+        capture_thread.join()
+        for thread in worker_threads:
+            thread.join()
+        if stats is not None:
+            stats.update({
+                "frames_captured": capture_stats["frames_captured"],
+                "frames_analyzed": frames_analyzed,
+                "frames_dropped": buffer.frames_dropped,
+                "elapsed_seconds": time.time() - start_time,
+                "capture_ms": 1000 * capture_stats["capture_seconds"] / max(capture_stats["frames_captured"], 1),
+            })
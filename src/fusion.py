@@ -0,0 +1,176 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+import joblib
+import numpy as np
+from src.emotions import EMOTION_LABELS
+from src import metrics
+
+MODALITIES = ("text", "voice", "face")
+
+# Relative trust in each modality when averaging their score vectors
+DEFAULT_WEIGHTS = {"text": 1.0, "voice": 1.0, "face": 1.0}
+FACE_DURATION = 5
+
+
+def fuse_scores(modality_scores, weights=None):
+    """
+    Late fusion by weighted average of per-modality score vectors.
+    Weights are renormalized over the modalities that produced scores.
+
+    Args:
+    - modality_scores (dict): {modality: score vector over EMOTION_LABELS}; None values are skipped.
+    - weights (dict | None): {modality: weight}. Defaults to DEFAULT_WEIGHTS.
+
+    Returns:
+    - np.ndarray | None: Fused distribution over EMOTION_LABELS, or None if no modality produced scores.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    fused = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+    total_weight = 0.0
+    for modality, scores in modality_scores.items():
+        weight = weights.get(modality, 0.0)
+        if scores is None or weight <= 0:
+            continue
+        fused += weight * np.asarray(scores, dtype=np.float32)
+        total_weight += weight
+    if total_weight == 0:
+        return None
+    fused /= total_weight
+    return fused / fused.sum() if fused.sum() > 0 else fused
+
+
+class LearnedCombiner:
+    """
+    Small learned fusion model: a logistic regression over the concatenated per-modality
+    score vectors. A missing modality is encoded as a zero vector plus a presence flag,
+    so one model handles every combination of available inputs.
+    """
+
+    def __init__(self, model=None):
+        self.model = model
+
+    @staticmethod
+    def _encode(modality_scores):
+        parts = []
+        for modality in MODALITIES:
+            scores = modality_scores.get(modality)
+            present = scores is not None
+            parts.append(np.asarray(scores, dtype=np.float32) if present else np.zeros(len(EMOTION_LABELS), dtype=np.float32))
+            parts.append(np.array([1.0 if present else 0.0], dtype=np.float32))
+        return np.concatenate(parts)
+
+    def fit(self, samples, labels):
+        """
+        Trains the combiner.
+
+        Args:
+        - samples (list[dict]): {modality: score vector or None} per example.
+        - labels (list[str]): Canonical emotion label per example.
+        """
+        from sklearn.linear_model import LogisticRegression
+        features = np.stack([self._encode(sample) for sample in samples])
+        self.model = LogisticRegression(max_iter=1000).fit(features, labels)
+        return self
+
+    def __call__(self, modality_scores):
+        """Returns the fused distribution over EMOTION_LABELS."""
+        probabilities = self.model.predict_proba(self._encode(modality_scores).reshape(1, -1))[0]
+        fused = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+        for label, probability in zip(self.model.classes_, probabilities):
+            fused[EMOTION_LABELS.index(label)] = probability
+        return fused
+
+    def save(self, path):
+        joblib.dump(self.model, path)
+
+    @classmethod
+    def load(cls, path):
+        return cls(joblib.load(path))
+
+
+def _run_text(text):
+    from src.text_detection import detect_text_emotion
+    return detect_text_emotion(text, return_scores=True)
+
+
+def _run_voice(audio):
+    from src.voice_detection import detect_voice_emotion
+    # audio=True means "record from the microphone"
+    return detect_voice_emotion(return_scores=True, audio=None if audio is True else audio)
+
+
+def _run_face(source, duration):
+    from src.face_detection import detect_face_emotion
+    # video=True means "use the default camera"
+    return detect_face_emotion(duration=duration, return_scores=True, source=0 if source is True else source)
+
+
+def detect_multimodal_emotion(text=None, audio=None, video=None, weights=None, combiner=None,
+                              face_duration=FACE_DURATION, detectors=None):
+    """
+    Runs the available modalities concurrently and fuses their score vectors.
+
+    Detectors run on threads: the models release the GIL during inference and are already
+    loaded once per process by the model registry, so the total latency is that of the
+    slowest modality rather than the sum.
+
+    Args:
+    - text (str | None): Text to analyze.
+    - audio (str | np.ndarray | bool | None): WAV path, signal, or True to record from the microphone.
+    - video (int | str | object | bool | None): Camera index, video file, capture-like object,
+      or True for the default camera.
+    - weights (dict | None): Per-modality weights for fuse_scores.
+    - combiner (callable | None): Replaces fuse_scores, e.g. a trained LearnedCombiner.
+    - face_duration (float | None): Seconds of video to analyze (None reads a file to the end).
+    - detectors (dict | None): {modality: callable(input) -> (label, scores)} overriding the
+      built-in detectors, e.g. with stubs.
+
+    Returns:
+    - dict: fused "emotion" and "scores", per-modality results under "modalities" and
+      per-modality and total latency in ms under "latency_ms".
+    """
+    runners = {
+        "text": _run_text,
+        "voice": _run_voice,
+        "face": lambda source: _run_face(source, face_duration),
+    }
+    runners.update(detectors or {})
+    inputs = {"text": text, "voice": audio, "face": video}
+    active = {modality: value for modality, value in inputs.items() if value is not None and value is not False}
+
+    def timed(modality):
+        start_time = time.perf_counter()
+        try:
+            with metrics.span(f"fusion.{modality}"):
+                label, scores = runners[modality](active[modality])
+        except Exception as e:
+            print(f"Warning: {modality} detection failed. Details: {e}")
+            label, scores = None, None
+        return label, scores, 1000 * (time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    modalities = {}
+    latency_ms = {}
+    if active:
+        with ThreadPoolExecutor(max_workers=len(active), thread_name_prefix="fusion") as executor:
+            # Copies of the caller's context keep each detector's spans in the caller's trace
+            futures = {modality: executor.submit(contextvars.copy_context().run, timed, modality) for modality in active}
+            for modality, future in futures.items():
+                label, scores, latency_ms[modality] = future.result()
+                modalities[modality] = {"emotion": label, "scores": scores}
+
+    modality_scores = {modality: result["scores"] for modality, result in modalities.items()}
+    if combiner is not None and any(scores is not None for scores in modality_scores.values()):
+        fused = combiner(modality_scores)
+    else:
+        fused = fuse_scores(modality_scores, weights)
+    latency_ms["total"] = 1000 * (time.perf_counter() - start_time)
+    metrics.observe(metrics.STAGE_METRIC, latency_ms["total"] / 1000, stage="fusion.total")
+
+    return {
+        "emotion": EMOTION_LABELS[int(np.argmax(fused))] if fused is not None else None,
+        "scores": fused,
+        "modalities": modalities,
+        "latency_ms": latency_ms,
+    }
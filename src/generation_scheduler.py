@@ -0,0 +1,326 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from src import metrics
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised by GenerationScheduler.submit when the request queue is full."""
+
+
+# Settings applied per request, with generate()'s defaults for those missing from the model's generation config
+SUPPORTED_SETTINGS = {
+    "max_length": 20,
+    "min_length": 0,
+    "do_sample": False,
+    "temperature": 1.0,
+    "top_k": 50,
+    "top_p": 1.0,
+    "no_repeat_ngram_size": 0,
+    "encoder_no_repeat_ngram_size": 0,
+    "repetition_penalty": 1.0,
+    "forced_bos_token_id": None,
+    "forced_eos_token_id": None,
+    "suppress_tokens": None,
+}
+# Settings the scheduler cannot apply, with the value at which generate() ignores them too
+UNSUPPORTED_SETTINGS = {
+    "num_beams": 1,
+    "num_beam_groups": 1,
+    "penalty_alpha": None,
+    "typical_p": 1.0,
+    "bad_words_ids": None,
+    "begin_suppress_tokens": None,
+    "max_new_tokens": None,
+}
+
+
+class _Request:
+    __slots__ = ("input_ids", "params", "future", "on_token", "generated", "encoder_state")
+
+    def __init__(self, input_ids, params, future, on_token, decoder_start_token_id):
+        self.input_ids = input_ids
+        self.params = params
+        self.future = future
+        self.on_token = on_token
+        self.generated = [decoder_start_token_id]
+        self.encoder_state = None
+
+
+class GenerationScheduler:
+    """
+    Continuous batching for an encoder-decoder model such as Blenderbot.
+
+    One worker thread owns the model. Requests are encoded once when they join, then every
+    step runs the decoder for all active requests together and samples one token per request
+    with its own parameters. Finished requests leave the batch and queued ones take their
+    place between steps, so the batch stays full while users keep sending messages.
+
+    Decoder inputs are right-padded. The decoder is causal, so the logits at each sequence's
+    last real position never see the padding after it.
+
+    Trade-off: steps keep no key/value cache. Each step re-runs the decoder over every active
+    request's whole prefix, so a reply of L tokens costs O(L^2) decoder positions instead of
+    the O(L) of generate(use_cache=True). Blenderbot's decoder derives positions from a single
+    past length for the whole batch, so requests at different lengths cannot share a cached
+    step. Batching wins while replies are short (max_length 100) and many users chat at
+    once. A single user is faster with generate(). Compare the chat and chat_scheduler
+    benchmarks on the target machine before enabling it.
+
+    Like generate(), each request starts from the model's generation config, overridden by
+    the settings passed to submit(). Only sampling and greedy decoding are implemented:
+    settings the scheduler cannot apply (beam search, bad_words_ids, ...) are rejected
+    by submit() rather than silently ignored.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_queue_depth=32, name="generation-scheduler"):
+        """
+        Args:
+        - model: Encoder-decoder model with get_encoder() and a forward accepting encoder_outputs.
+        - max_batch_size (int): Most requests decoded together in one step.
+        - max_queue_depth (int): Most requests waiting to join; submit raises SchedulerBusy beyond it.
+        - name (str): Name of the worker thread.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_queue_depth = max_queue_depth
+        self.name = name
+        config = model.config
+        self.decoder_start_token_id = config.decoder_start_token_id
+        self.eos_token_id = config.eos_token_id
+        self.pad_token_id = config.pad_token_id
+        # generate() starts from the model's generation config; so does every request here
+        generation_config = getattr(model, "generation_config", None)
+        self.defaults = {
+            setting: getattr(generation_config, setting, default)
+            for setting, default in {**SUPPORTED_SETTINGS, **UNSUPPORTED_SETTINGS}.items()
+        }
+        self.stats = Counter()
+        self._reset()
+        # Threads do not survive fork, so a forked child gets its own queue and worker
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._start_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self.max_queue_depth)
+        self._active_count = 0
+        self._worker = threading.Thread(target=self._run, args=(self._queue,), name=self.name, daemon=True)
+
+    def submit(self, input_ids, on_token=None, **settings):
+        """
+        Queues one generation request.
+
+        Args:
+        - input_ids (list[int]): Encoder input ids, including special tokens.
+        - on_token (callable | None): Called with each generated token id from the worker thread.
+          Returning False stops the request early.
+        - **settings: generate() settings overriding the model's generation config: max_length
+          (counting the decoder start token), min_length, do_sample, temperature, top_k, top_p,
+          no_repeat_ngram_size, encoder_no_repeat_ngram_size, repetition_penalty,
+          forced_bos_token_id, forced_eos_token_id and suppress_tokens.
+
+        Returns:
+        - Future: Resolves to the generated token ids, without the decoder start token.
+
+        Raises:
+        - ValueError: If the effective settings need decoding the scheduler does not implement.
+        - SchedulerBusy: If the request queue is full.
+        """
+        unknown = set(settings) - set(self.defaults)
+        if unknown:
+            raise TypeError(f"Unknown generation settings: {', '.join(sorted(unknown))}.")
+        params = {**self.defaults, **settings}
+        for setting, neutral in UNSUPPORTED_SETTINGS.items():
+            if params[setting] != neutral:
+                raise ValueError(
+                    f"{self.name} cannot apply {setting}={params[setting]!r} (model generation config or request); "
+                    f"pass {setting}={neutral!r} or use generate()."
+                )
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait(_Request(list(input_ids), params, future, on_token, self.decoder_start_token_id))
+        except queue.Full:
+            self.stats["rejected"] += 1
+            metrics.increment("emotionix_chat_scheduler_rejected_total")
+            raise SchedulerBusy(f"{self.name} has {self.max_queue_depth} requests waiting; try again shortly.")
+        self.stats["submitted"] += 1
+        return future
+
+    def _ensure_started(self):
+        if not self._worker.is_alive():
+            with self._start_lock:
+                if not self._worker.is_alive():
+                    self._worker.start()
+
+    def metrics(self):
+        """Returns request and token counters, the current queue depth and batch size, and tokens/s while busy."""
+        stats = dict(self.stats, queue_depth=self._queue.qsize(), active=self._active_count)
+        busy_seconds = stats.get("busy_seconds", 0.0)
+        stats["tokens_per_second"] = stats.get("tokens", 0) / busy_seconds if busy_seconds else 0.0
+        return stats
+
+    def _admit(self, pending, active):
+        """Takes queued requests for the batch, blocking only when there is nothing to decode."""
+        joining = []
+        if not active:
+            joining.append(pending.get())
+        while len(active) + len(joining) < self.max_batch_size:
+            try:
+                joining.append(pending.get_nowait())
+            except queue.Empty:
+                break
+        # Skip callers that gave up while queued
+        return [request for request in joining if request.future.set_running_or_notify_cancel()]
+
+    def _encode(self, requests):
+        import torch
+        length = max(len(request.input_ids) for request in requests)
+        input_ids = torch.full((len(requests), length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(requests), length), dtype=torch.long)
+        for i, request in enumerate(requests):
+            input_ids[i, :len(request.input_ids)] = torch.tensor(request.input_ids)
+            attention_mask[i, :len(request.input_ids)] = 1
+        hidden = self.model.get_encoder()(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        for i, request in enumerate(requests):
+            request.encoder_state = hidden[i, :len(request.input_ids)]
+
+    def _encoder_batch(self, active):
+        import torch
+        length = max(request.encoder_state.shape[0] for request in active)
+        hidden = active[0].encoder_state.new_zeros((len(active), length, active[0].encoder_state.shape[1]))
+        mask = torch.zeros((len(active), length), dtype=torch.long)
+        for i, request in enumerate(active):
+            hidden[i, :request.encoder_state.shape[0]] = request.encoder_state
+            mask[i, :request.encoder_state.shape[0]] = 1
+        return hidden, mask
+
+    def _step(self, active, encoder_batch):
+        """Runs one decoder step for the whole batch and returns next-token logits, one row per request."""
+        import torch
+        hidden, encoder_mask = encoder_batch
+        length = max(len(request.generated) for request in active)
+        decoder_input_ids = torch.full((len(active), length), self.pad_token_id, dtype=torch.long)
+        for i, request in enumerate(active):
+            decoder_input_ids[i, :len(request.generated)] = torch.tensor(request.generated)
+        logits = self.model(
+            encoder_outputs=(hidden,),
+            attention_mask=encoder_mask,
+            decoder_input_ids=decoder_input_ids,
+            use_cache=False,
+        ).logits
+        last_positions = torch.tensor([len(request.generated) - 1 for request in active])
+        return logits[torch.arange(len(active)), last_positions]
+
+    def _choose(self, request, logits):
+        """Applies the request's logits processors and sampling parameters and returns the next token id."""
+        import torch
+        params = request.params
+        logits = logits.float().clone()
+        generated = request.generated
+
+        # Same processors, in the same order, as generate()
+        if params["repetition_penalty"] != 1.0:
+            seen = torch.tensor(sorted(set(generated)))
+            scores = logits[seen]
+            logits[seen] = torch.where(scores < 0, scores * params["repetition_penalty"], scores / params["repetition_penalty"])
+        n = params["no_repeat_ngram_size"]
+        if n and len(generated) >= n:
+            prefix = generated[len(generated) - n + 1:]
+            for i in range(len(generated) - n + 1):
+                if generated[i:i + n - 1] == prefix:
+                    logits[generated[i + n - 1]] = -float("inf")
+        n = params["encoder_no_repeat_ngram_size"]
+        if n and len(generated) >= n - 1:
+            # Do not copy n-grams of the user's message into the reply
+            prefix = generated[len(generated) - n + 1:] if n > 1 else []
+            source = request.input_ids
+            for i in range(len(source) - n + 1):
+                if source[i:i + n - 1] == prefix:
+                    logits[source[i + n - 1]] = -float("inf")
+        if len(generated) < params["min_length"]:
+            logits[self.eos_token_id] = -float("inf")
+        if params["suppress_tokens"]:
+            logits[list(params["suppress_tokens"])] = -float("inf")
+        forced = None
+        if len(generated) == 1 and params["forced_bos_token_id"] is not None:
+            forced = params["forced_bos_token_id"]
+        elif len(generated) == params["max_length"] - 1 and params["forced_eos_token_id"] is not None:
+            forced = params["forced_eos_token_id"]
+        if forced is not None:
+            # generate() accepts a single id or a list of ids
+            return forced if isinstance(forced, int) else int(forced[0])
+
+        if not params["do_sample"]:
+            return int(torch.argmax(logits))
+        logits /= max(params["temperature"], 1e-5)
+        if params["top_k"]:
+            kth_value = torch.topk(logits, min(params["top_k"], logits.shape[-1])).values[-1]
+            logits[logits < kth_value] = -float("inf")
+        if params["top_p"] < 1.0:
+            sorted_logits, sorted_indices = torch.sort(logits, descending=True)
+            cumulative = torch.softmax(sorted_logits, dim=-1).cumsum(dim=-1)
+            # Keep the smallest set of tokens whose probability reaches top_p
+            remove = cumulative > params["top_p"]
+            remove[1:] = remove[:-1].clone()
+            remove[0] = False
+            logits[sorted_indices[remove]] = -float("inf")
+        return int(torch.multinomial(torch.softmax(logits, dim=-1), 1))
+
+    def _run(self, pending):
+        import torch
+        active = []
+        encoder_batch = None
+        while True:
+            # Dequeued before anything can fail, so a failing step still resolves every taken request
+            joining = self._admit(pending, active)
+            try:
+                with torch.inference_mode():
+                    start_time = time.perf_counter()
+                    if joining:
+                        self._encode(joining)
+                        active.extend(joining)
+                        encoder_batch = None
+                    self._active_count = len(active)
+                    if encoder_batch is None:
+                        encoder_batch = self._encoder_batch(active)
+                    next_logits = self._step(active, encoder_batch)
+                    tokens = [self._choose(request, next_logits[i]) for i, request in enumerate(active)]
+            except Exception as e:
+                for request in active + [request for request in joining if request not in active]:
+                    request.future.set_exception(e)
+                active, encoder_batch = [], None
+                self._active_count = 0
+                continue
+
+            finished = []
+            for request, token in zip(active, tokens):
+                request.generated.append(token)
+                keep_going = True
+                if request.on_token is not None:
+                    try:
+                        keep_going = request.on_token(token) is not False
+                    except Exception as e:
+                        print(f"Warning: {self.name} token callback failed. Details: {e}")
+                if token == self.eos_token_id or len(request.generated) >= request.params["max_length"] or not keep_going:
+                    finished.append(request)
+            step_seconds = time.perf_counter() - start_time
+            self.stats["steps"] += 1
+            self.stats["tokens"] += len(tokens)
+            self.stats["busy_seconds"] += step_seconds
+            metrics.observe(metrics.STAGE_METRIC, step_seconds, stage="chat.scheduler_step")
+            metrics.increment("emotionix_chat_tokens_total", len(tokens))
+            metrics.set_gauge("emotionix_chat_scheduler_active", len(active))
+            metrics.set_gauge("emotionix_chat_scheduler_queue_depth", self._queue.qsize())
+
+            if finished:
+                for request in finished:
+                    request.future.set_result(request.generated[1:])
+                    self.stats["completed"] += 1
+                active = [request for request in active if request not in finished]
+                encoder_batch = None
+                self._active_count = len(active)
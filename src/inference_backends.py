@@ -0,0 +1,273 @@
+import os
+import numpy as np
+
+# Inference backends for the transformer models:
+# - "pytorch": full-precision PyTorch (the original behavior)
+# - "int8": PyTorch with every nn.Linear dynamically quantized to int8
+# - "onnx": graph exported once to ONNX and run with ONNX Runtime
+BACKENDS = ("pytorch", "int8", "onnx")
+
+# Exported ONNX graphs are cached here, one directory per model
+ONNX_DIR = os.environ.get("EMOTIONIX_ONNX_DIR", "./.onnx_models")
+
+# Texts longer than the model's limit are split into windows of at most MAX_WINDOW_TOKENS tokens
+# that overlap by WINDOW_STRIDE tokens. Windows are run WINDOW_BATCH_SIZE at a time.
+MAX_WINDOW_TOKENS = 512
+WINDOW_STRIDE = 64
+WINDOW_BATCH_SIZE = 32
+
+# Tolerances used by check_parity
+LABEL_AGREEMENT_THRESHOLD = 0.98
+LOGIT_ATOL = 0.5
+
+
+def backend_from_env(variable, default="pytorch"):
+    """Reads a backend name from an environment variable, falling back to `default` if it is unknown."""
+    backend = os.environ.get(variable, default).strip().lower()
+    if backend not in BACKENDS:
+        print(f"Warning: Unknown inference backend '{backend}' in {variable}; using '{default}'.")
+        return default
+    return backend
+
+
+def _onnx_path(model_name):
+    return os.path.join(ONNX_DIR, model_name.replace("/", "--"))
+
+
+def _quantize(model):
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class _TorchForward:
+    def __init__(self, model):
+        self.model = model.eval()
+
+    def __call__(self, encoded):
+        import torch
+        with torch.inference_mode():
+            inputs = {name: torch.from_numpy(array) for name, array in encoded.items()}
+            return self.model(**inputs).logits.numpy()
+
+
+class _OnnxForward:
+    """Runs an exported classifier with ONNX Runtime, binding NumPy inputs directly through IO binding."""
+
+    def __init__(self, model_path):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.output_name = self.session.get_outputs()[0].name
+
+    def __call__(self, encoded):
+        binding = self.session.io_binding()
+        for name, array in encoded.items():
+            if name in self.input_names:
+                binding.bind_cpu_input(name, np.ascontiguousarray(array, dtype=np.int64))
+        binding.bind_output(self.output_name)
+        self.session.run_with_iobinding(binding)
+        return binding.copy_outputs_to_cpu()[0]
+
+
+class SequenceClassifier:
+    """
+    Tokenizer plus a backend forward pass. Calling it on a list of texts returns one
+    {label: probability} dict per text, like a text-classification pipeline with top_k=None.
+
+    Texts longer than max_length tokens are not truncated: each is split into overlapping
+    windows, and its distribution is the average of its windows' probabilities weighted by
+    their token counts. Windows of all texts are classified together, so the cost grows
+    linearly with the total length.
+    """
+
+    def __init__(self, tokenizer, forward, id2label, backend, max_length=MAX_WINDOW_TOKENS,
+                 stride=WINDOW_STRIDE, window_batch_size=WINDOW_BATCH_SIZE):
+        self.tokenizer = tokenizer
+        self.forward = forward
+        self.id2label = id2label
+        self.backend = backend
+        self.max_length = max_length
+        self.stride = stride
+        self.window_batch_size = window_batch_size
+
+    def logits(self, texts):
+        # Pad to the longest text of the batch only
+        encoded = self.tokenizer(list(texts), padding=True, truncation=True, return_tensors="np")
+        return self.forward(dict(encoded))
+
+    def windows(self, texts):
+        """
+        Tokenizes the texts once into windows of at most max_length tokens.
+
+        Returns:
+        - tuple: (list of per-window encodings, np.ndarray with the index of each window's text)
+        """
+        encoded = dict(self.tokenizer(
+            list(texts), truncation=True, max_length=self.max_length, stride=self.stride, return_overflowing_tokens=True
+        ))
+        owners = encoded.pop("overflow_to_sample_mapping", None)
+        windows = [{name: values[i] for name, values in encoded.items()} for i in range(len(encoded["input_ids"]))]
+        return windows, np.asarray(owners if owners is not None else range(len(windows)))
+
+    def __call__(self, texts):
+        texts = list(texts)
+        windows, owners = self.windows(texts)
+        lengths = np.array([len(window["input_ids"]) for window in windows])
+        # Windows of similar length are batched together, so short texts are not padded to a long one's windows
+        order = np.argsort(lengths, kind="stable")
+        logits = np.empty((len(windows), len(self.id2label)), dtype=np.float32)
+        for start in range(0, len(order), self.window_batch_size):
+            batch = order[start:start + self.window_batch_size]
+            padded = self.tokenizer.pad([windows[i] for i in batch], return_tensors="np")
+            logits[batch] = self.forward(dict(padded))
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probabilities = exp / exp.sum(axis=1, keepdims=True)
+
+        # A text with a single window keeps that window's probabilities
+        totals = np.zeros((len(texts), probabilities.shape[1]), dtype=np.float64)
+        np.add.at(totals, owners, probabilities * lengths[:, None])
+        totals /= np.bincount(owners, weights=lengths, minlength=len(texts))[:, None]
+        return [{self.id2label[i]: float(p) for i, p in enumerate(row)} for row in totals]
+
+
+def load_sequence_classifier(model_name, backend="pytorch"):
+    """
+    Loads a sequence classification model with the given backend.
+
+    Args:
+    - model_name (str): Hugging Face model id.
+    - backend (str): One of BACKENDS.
+
+    Returns:
+    - SequenceClassifier
+    """
+    from transformers import AutoConfig, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    id2label = {int(i): label for i, label in AutoConfig.from_pretrained(model_name).id2label.items()}
+    # Tokenizers without a configured limit report a huge model_max_length
+    max_length = min(tokenizer.model_max_length, MAX_WINDOW_TOKENS)
+
+    if backend == "onnx":
+        path = _onnx_path(model_name)
+        if not os.path.exists(os.path.join(path, "model.onnx")):
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+            ORTModelForSequenceClassification.from_pretrained(model_name, export=True).save_pretrained(path)
+        forward = _OnnxForward(os.path.join(path, "model.onnx"))
+    else:
+        from transformers import AutoModelForSequenceClassification
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        forward = _TorchForward(_quantize(model) if backend == "int8" else model)
+    return SequenceClassifier(tokenizer, forward, id2label, backend, max_length=max_length)
+
+
+def load_seq2seq(model_name, backend="pytorch"):
+    """
+    Loads a sequence-to-sequence generation model with the given backend. Every backend
+    supports model.generate with the decoder key/value cache.
+
+    Args:
+    - model_name (str): Hugging Face model id.
+    - backend (str): One of BACKENDS.
+
+    Returns:
+    - tuple: (tokenizer, model)
+    """
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        path = _onnx_path(model_name)
+        if os.path.exists(os.path.join(path, "config.json")):
+            model = ORTModelForSeq2SeqLM.from_pretrained(path, use_cache=True)
+        else:
+            # Exports the encoder, the decoder and the decoder-with-past graphs
+            model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True)
+            model.save_pretrained(path)
+        return tokenizer, model
+
+    from transformers import AutoModelForSeq2SeqLM
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name).eval()
+    return tokenizer, _quantize(model) if backend == "int8" else model
+
+
+def _first_step_logits(tokenizer, model, texts):
+    # Logits of the first decoded token, the teacher-forced step every reply starts with
+    import torch
+    logits = []
+    with torch.inference_mode():
+        for text in texts:
+            inputs = tokenizer(text, return_tensors="pt", truncation=True)
+            decoder_input_ids = torch.tensor([[model.config.decoder_start_token_id]])
+            logits.append(np.asarray(model(**inputs, decoder_input_ids=decoder_input_ids).logits[0, -1]))
+    return np.stack(logits)
+
+
+def check_parity(reference_logits, candidate_logits, min_agreement=LABEL_AGREEMENT_THRESHOLD, atol=LOGIT_ATOL):
+    """
+    Compares two backends on the same inputs.
+
+    Args:
+    - reference_logits, candidate_logits (np.ndarray): (n_inputs, n_classes) logits.
+    - min_agreement (float): Minimum fraction of inputs whose argmax must match.
+    - atol (float): Maximum allowed absolute logit difference.
+
+    Returns:
+    - dict: "label_agreement", "max_abs_diff", "mean_abs_diff" and whether the candidate "passed".
+    """
+    reference_logits = np.asarray(reference_logits, dtype=np.float32)
+    candidate_logits = np.asarray(candidate_logits, dtype=np.float32)
+    agreement = float(np.mean(reference_logits.argmax(axis=1) == candidate_logits.argmax(axis=1)))
+    diff = np.abs(reference_logits - candidate_logits)
+    return {
+        "label_agreement": agreement,
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "passed": agreement >= min_agreement and float(diff.max()) <= atol,
+    }
+
+
+PARITY_TEXTS = (
+    "I am so happy today, everything went great!",
+    "This is the worst day of my life.",
+    "I can't believe they cancelled the show again, I'm furious.",
+    "Things will get better soon, I'm sure of it.",
+    "I miss my friends so much.",
+    "What a wonderful surprise party!",
+    "I'm nervous about the exam tomorrow.",
+    "Just another ordinary afternoon.",
+)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Compare inference backends against full-precision PyTorch.")
+    parser.add_argument("model", choices=("text", "chat"), help="Which model to check.")
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"], choices=BACKENDS)
+    args = parser.parse_args()
+
+    if args.model == "text":
+        from src.text_detection import TEXT_MODEL_NAME
+        reference = load_sequence_classifier(TEXT_MODEL_NAME, "pytorch").logits(PARITY_TEXTS)
+        for backend in args.backends:
+            classifier = load_sequence_classifier(TEXT_MODEL_NAME, backend)
+            start_time = time.perf_counter()
+            candidate = classifier.logits(PARITY_TEXTS)
+            elapsed_ms = 1000 * (time.perf_counter() - start_time)
+            print(backend, check_parity(reference, candidate), f"{elapsed_ms:.1f} ms")
+    else:
+        from src.chatbot import model_name
+        tokenizer, model = load_seq2seq(model_name, "pytorch")
+        reference = _first_step_logits(tokenizer, model, PARITY_TEXTS)
+        for backend in args.backends:
+            tokenizer, model = load_seq2seq(model_name, backend)
+            start_time = time.perf_counter()
+            candidate = _first_step_logits(tokenizer, model, PARITY_TEXTS)
+            elapsed_ms = 1000 * (time.perf_counter() - start_time)
+            # Vocabulary-sized logits drift more under quantization, so only the top token is held to the threshold
+            print(backend, check_parity(reference, candidate, atol=np.inf), f"{elapsed_ms:.1f} ms")
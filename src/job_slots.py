@@ -0,0 +1,117 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# A slot held by a job that died is free again after at most LEASE_SECONDS
+LEASE_SECONDS = 30
+POLL_INTERVAL = 0.1
+
+
+class JobsBusy(RuntimeError):
+    """Raised by JobSlots.hold when every slot is taken and the waiting line is full."""
+
+
+class JobSlots:
+    """
+    Limits how many jobs run at once across every process sharing a diskcache.Cache.
+
+    Each slot is a cache key holding the lease id of the job that owns it, with its own
+    expiry. While a job runs, a heartbeat thread keeps extending its lease. A job that is
+    killed (cancelled background callback, OOM) stops renewing, so its slot frees itself
+    after `lease_seconds` no matter how busy the other slots are.
+
+    With `max_waiting`, jobs waiting for a slot hold a lease on one of `max_waiting` waiting
+    places the same way, and a job finding none free raises JobsBusy at once. Job processes
+    then never pile up: at most `slots` run and `max_waiting` wait.
+    """
+
+    def __init__(self, cache, name, slots, lease_seconds=LEASE_SECONDS, poll_interval=POLL_INTERVAL, max_waiting=None):
+        """
+        Args:
+        - cache (diskcache.Cache): Cache shared by the job processes.
+        - name (str): Prefix of the slot keys.
+        - slots (int): Most jobs holding a slot at once.
+        - lease_seconds (float): Expiry of a lease that is no longer renewed.
+        - poll_interval (float): Seconds between attempts while every slot is taken.
+        - max_waiting (int | None): Most jobs waiting for a slot at once, or None for no limit.
+        """
+        self.cache = cache
+        self.name = name
+        self.slots = slots
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.waiting = None
+        if max_waiting is not None:
+            self.waiting = JobSlots(cache, f"{name}:waiting", max_waiting, lease_seconds, poll_interval)
+
+    def _keys(self):
+        return [f"{self.name}:{i}" for i in range(self.slots)]
+
+    def try_acquire(self):
+        """Returns the (key, lease id) of a free slot, or None if every slot is taken."""
+        lease = uuid.uuid4().hex
+        for key in self._keys():
+            # add() only succeeds when the key is missing or its lease has expired
+            if self.cache.add(key, lease, expire=self.lease_seconds):
+                return key, lease
+        return None
+
+    def acquire(self):
+        """Blocks until a slot is free and returns its (key, lease id)."""
+        while True:
+            slot = self.try_acquire()
+            if slot is not None:
+                return slot
+            time.sleep(self.poll_interval)
+
+    def _owns(self, key, lease):
+        return self.cache.get(key) == lease
+
+    def _renew(self, key, lease, stop):
+        while not stop.wait(self.lease_seconds / 3):
+            with self.cache.transact():
+                if not self._owns(key, lease):
+                    return
+                self.cache.touch(key, expire=self.lease_seconds)
+
+    def release(self, key, lease):
+        with self.cache.transact():
+            if self._owns(key, lease):
+                self.cache.delete(key)
+
+    def in_use(self):
+        """Returns the number of slots currently leased."""
+        return sum(self.cache.get(key) is not None for key in self._keys())
+
+    @contextmanager
+    def _leased(self, key, lease):
+        # Renews the lease in the background until the block ends, then releases it
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._renew, args=(key, lease, stop), name="job-slot-lease", daemon=True)
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            heartbeat.join()
+            self.release(key, lease)
+
+    def _wait_for_slot(self):
+        if self.waiting is None:
+            return self.acquire()
+        place = self.waiting.try_acquire()
+        if place is None:
+            raise JobsBusy(f"All {self.slots} workers are busy and {self.waiting.slots} jobs are waiting; try again shortly.")
+        with self.waiting._leased(*place):
+            return self.acquire()
+
+    @contextmanager
+    def hold(self):
+        """
+        Holds one slot for the duration of the block, renewing its lease in the background.
+        Raises JobsBusy if the slot would have to be waited for and the waiting line is full.
+        """
+        slot = self.try_acquire() or self._wait_for_slot()
+        with self._leased(*slot):
+            yield
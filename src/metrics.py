@@ -0,0 +1,359 @@
+import bisect
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+# Latency histogram buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_METRIC = "emotionix_stage_seconds"
+CALLBACK_METRIC = "emotionix_callback_seconds"
+ERROR_METRIC = "emotionix_errors_total"
+
+# Background jobs run in forked processes. They flush their metrics and profiles into
+# SHARED_DIR, and the server process merges them when /metrics is scraped.
+SHARED_DIR = os.environ.get("EMOTIONIX_METRICS_DIR") or None
+# Append one JSON line per traced request to this file; set_trace_log() switches it at runtime
+TRACE_LOG = os.environ.get("EMOTIONIX_TRACE_LOG") or None
+PROFILE_INTERVAL = 0.005
+
+# (name, sorted label items) -> value for counters and gauges, [bucket counts..., +Inf count, sum] for histograms
+_counters = Counter()
+_gauges = {}
+_histograms = {}
+_lock = threading.Lock()
+_current_trace = contextvars.ContextVar("emotionix_trace", default=None)
+
+
+def _reset_after_fork():
+    # A forked job starts from zero so its flushed deltas never double count the parent's values
+    global _lock, _profiler
+    _lock = threading.Lock()
+    _counters.clear()
+    _gauges.clear()
+    _histograms.clear()
+    _profiler = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    """Adds `amount` to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] += amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = float(value)
+
+
+def observe(name, seconds, **labels):
+    """Records one latency observation in a histogram."""
+    key = _key(name, labels)
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        histogram[index] += 1
+        histogram[-1] += seconds
+
+
+@contextmanager
+def span(stage, **labels):
+    """
+    Times a block as one stage: records it in the stage latency histogram and in the current trace,
+    and counts an error for the stage if the block raises.
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        increment(ERROR_METRIC, stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start_time
+        observe(STAGE_METRIC, elapsed, stage=stage, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace["spans"].append({
+                "stage": stage,
+                "start_ms": round(1000 * (start_time - trace["start"]), 3),
+                "duration_ms": round(1000 * elapsed, 3),
+            })
+
+
+def timed(stage, **labels):
+    """Decorator form of span()."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_error(stage):
+    """Counts an error that was handled (e.g. replaced by a fallback) rather than raised."""
+    increment(ERROR_METRIC, stage=stage)
+
+
+# Per-request traces
+
+@contextmanager
+def trace(name):
+    """
+    Records the block's latency in the per-request histogram (CALLBACK_METRIC, labelled with `name`).
+    While the trace log is on, also collects every span inside the block (including spans on threads
+    started with contextvars.copy_context()) and appends them as one JSON line to TRACE_LOG.
+    """
+    start_time = time.perf_counter()
+    log_path = TRACE_LOG
+    record = token = None
+    if log_path is not None:
+        record = {"request": name, "id": uuid.uuid4().hex, "timestamp": time.time(), "start": start_time, "spans": []}
+        token = _current_trace.set(record)
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - start_time
+        observe(CALLBACK_METRIC, elapsed, callback=name)
+        if record is not None:
+            _current_trace.reset(token)
+            del record["start"]
+            record["total_ms"] = round(1000 * elapsed, 3)
+            try:
+                with open(log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                print(f"Warning: Could not write trace log. Details: {e}")
+
+
+def set_trace_log(path):
+    """
+    Enables (path) or disables (None) the per-request trace log at runtime. Background jobs
+    forked afterwards inherit the setting.
+    """
+    global TRACE_LOG
+    TRACE_LOG = path
+
+
+def trace_log():
+    """Returns the current trace log path, or None while tracing is off."""
+    return TRACE_LOG
+
+
+# Sharing between processes
+
+def set_shared_dir(path):
+    """Sets the directory where forked job processes leave their metrics for the server to merge."""
+    global SHARED_DIR
+    SHARED_DIR = path
+    if path:
+        os.makedirs(path, exist_ok=True)
+
+
+def flush():
+    """
+    Writes this process's metrics since the last flush to SHARED_DIR and resets them.
+    Called at the end of every background job; does nothing without a shared directory.
+    """
+    if not SHARED_DIR:
+        return
+    with _lock:
+        snapshot = {
+            "counters": [[name, labels, value] for (name, labels), value in _counters.items()],
+            "histograms": [[name, labels, values] for (name, labels), values in _histograms.items()],
+        }
+        _counters.clear()
+        _histograms.clear()
+    if not snapshot["counters"] and not snapshot["histograms"]:
+        return
+    path = os.path.join(SHARED_DIR, f"metrics-{os.getpid()}-{uuid.uuid4().hex}.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(path + ".tmp", path)
+
+
+def _absorb_shared():
+    """Adds every flushed snapshot in SHARED_DIR to this process's metrics and removes it."""
+    if not SHARED_DIR or not os.path.isdir(SHARED_DIR):
+        return
+    for filename in os.listdir(SHARED_DIR):
+        if not (filename.startswith("metrics-") and filename.endswith(".json")):
+            continue
+        path = os.path.join(SHARED_DIR, filename)
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            os.remove(path)
+        except (OSError, ValueError):
+            continue
+        with _lock:
+            for name, labels, value in snapshot["counters"]:
+                _counters[(name, tuple(map(tuple, labels)))] += value
+            for name, labels, values in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                histogram = _histograms.setdefault(key, [0] * (len(BUCKETS) + 1) + [0.0])
+                for i, value in enumerate(values):
+                    histogram[i] += value
+
+
+# Prometheus exposition
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+
+def _model_gauges():
+    from src.model_registry import model_stats
+    for name, stats in model_stats().items():
+        if "rss_delta_mb" in stats:
+            set_gauge("emotionix_model_rss_delta_mb", stats["rss_delta_mb"], model=name)
+
+
+def render_prometheus():
+    """Returns all metrics, including those flushed by job processes, in the Prometheus text format."""
+    _absorb_shared()
+    _model_gauges()
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((key, list(values)) for key, values in _histograms.items())
+
+    declared = set()
+
+    def declare(name, kind):
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counters:
+        declare(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), value in gauges:
+        declare(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), values in histograms:
+        declare(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), values[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# Sampling profiler
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread in this process at a fixed interval on a daemon thread
+    and counts them as collapsed stacks ("outer;inner;leaf count"), the input format of flame graph tools.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+_profiler = None
+
+
+def _profile_flag():
+    return os.path.join(SHARED_DIR, "profiler.on") if SHARED_DIR else None
+
+
+def start_profiler(interval=PROFILE_INTERVAL):
+    """Starts sampling this process and, with a shared directory, every job started from now on."""
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler(interval).start()
+    if _profile_flag():
+        open(_profile_flag(), "w").close()
+
+
+def stop_profiler():
+    """Stops profiling and returns the collapsed stacks of this process and of the profiled jobs."""
+    global _profiler
+    stacks = _profiler.stop() if _profiler is not None else Counter()
+    _profiler = None
+    if _profile_flag():
+        if os.path.exists(_profile_flag()):
+            os.remove(_profile_flag())
+        for filename in os.listdir(SHARED_DIR):
+            if filename.startswith("profile-") and filename.endswith(".json"):
+                path = os.path.join(SHARED_DIR, filename)
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        stacks.update(json.load(f))
+                    os.remove(path)
+                except (OSError, ValueError):
+                    continue
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+def profiler_running():
+    return _profiler is not None or bool(_profile_flag() and os.path.exists(_profile_flag()))
+
+
+@contextmanager
+def profile_job():
+    """Samples the block while the profiler is switched on and leaves the stacks in SHARED_DIR."""
+    if not (_profile_flag() and os.path.exists(_profile_flag())):
+        yield
+        return
+    profiler = SamplingProfiler().start()
+    try:
+        yield
+    finally:
+        stacks = profiler.stop()
+        path = os.path.join(SHARED_DIR, f"profile-{os.getpid()}-{uuid.uuid4().hex}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(stacks, f)
+        os.replace(path + ".tmp", path)
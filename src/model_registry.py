@@ -0,0 +1,146 @@
+import os
+import resource
+import sys
+import threading
+import time
+from src import metrics
+
+# Registered loaders, loaded instances and per-model load statistics
+_loaders = {}
+_models = {}
+_stats = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _reset_locks_after_fork():
+    # A lock held by a warm-up thread at fork time would never be released in the child
+    global _registry_lock
+    _registry_lock = threading.Lock()
+    for name in _locks:
+        _locks[name] = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+def _current_rss_mb():
+    """
+    Returns the resident set size of this process in MB.
+    Reads /proc on Linux and falls back to the peak RSS reported by getrusage elsewhere.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in KB on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def register_model(name, loader):
+    """
+    Registers a zero-argument loader for a model without loading it.
+
+    Args:
+    - name (str): Key used to fetch the model with get_model.
+    - loader (callable): Function returning the loaded model or client.
+    """
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+
+
+def get_model(name):
+    """
+    Returns the model registered under `name`, loading it on first use.
+
+    Concurrent callers asking for the same model wait for a single load.
+    """
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        if name not in _loaders:
+            raise KeyError(f"No model registered under '{name}'.")
+        lock = _locks[name]
+
+    with lock:
+        if name in _models:
+            return _models[name]
+
+        print(f"Loading model '{name}'...")
+        rss_before = _current_rss_mb()
+        start_time = time.perf_counter()
+        model = _loaders[name]()
+        load_seconds = time.perf_counter() - start_time
+        rss_delta = _current_rss_mb() - rss_before
+
+        _stats[name] = {"load_seconds": load_seconds, "rss_delta_mb": rss_delta}
+        metrics.observe("emotionix_model_load_seconds", load_seconds, model=name)
+        _models[name] = model
+        print(f"Model '{name}' loaded in {load_seconds:.2f}s (+{rss_delta:.1f} MB RSS).")
+        return model
+
+
+def is_loaded(name):
+    """Returns True if the model has already been loaded."""
+    return name in _models
+
+
+def unload_model(name):
+    """Drops a loaded model so it can be garbage collected and reloaded later."""
+    with _locks.get(name, _registry_lock):
+        _models.pop(name, None)
+        _stats.pop(name, None)
+
+
+def model_stats():
+    """
+    Returns a dict describing every registered model:
+    whether it is loaded, and its load time and RSS growth if it is.
+    """
+    with _registry_lock:
+        names = list(_loaders)
+    report = {}
+    for name in names:
+        entry = {"loaded": name in _models}
+        entry.update(_stats.get(name, {}))
+        report[name] = entry
+    return report
+
+
+def warm_up(names=None, background=True):
+    """
+    Loads the given models ahead of their first request.
+
+    Args:
+    - names (list[str] | None): Models to load. Defaults to the comma-separated
+      EMOTIONIX_WARMUP environment variable, or nothing if it is unset.
+    - background (bool): Load on a daemon thread instead of blocking the caller.
+
+    Returns:
+    - threading.Thread | None: The warm-up thread when running in the background.
+    """
+    if names is None:
+        names = [n.strip() for n in os.environ.get("EMOTIONIX_WARMUP", "").split(",") if n.strip()]
+    if not names:
+        return None
+
+    def _load_all():
+        for name in names:
+            try:
+                get_model(name)
+            except Exception as e:
+                print(f"Warning: Failed to warm up model '{name}'. Details: {e}")
+
+    if not background:
+        _load_all()
+        return None
+
+    thread = threading.Thread(target=_load_all, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
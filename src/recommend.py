@@ -1,75 +1,235 @@
-import google.generativeai as genai
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-
-# Configure the Google Generative AI API key
-genai.configure(api_key="")
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import time
+from src.model_registry import register_model, get_model
+from src.cache import TTLCache
+from src import metrics
+from src.emotions import Emotion, normalize_emotion
+
+# Google Generative AI API key
+GEMINI_API_KEY = ""
+GEMINI_MODEL_NAME = "gemini-1.5-flash"
 
 # Spotify API credentials
 SPOTIFY_CLIENT_ID = ""
 SPOTIFY_CLIENT_SECRET = ""
 REDIRECT_URI = "http://localhost:8888/callback"
 
-# Set up Spotify API authentication
-sp = spotipy.Spotify(
-    auth_manager=SpotifyOAuth(
-        client_id=SPOTIFY_CLIENT_ID,
-        client_secret=SPOTIFY_CLIENT_SECRET,
-        redirect_uri=REDIRECT_URI,
-        scope="playlist-read-private"
+# Per-call timeouts (seconds) for the concurrent Gemini and Spotify requests
+GEMINI_TIMEOUT = float(os.environ.get("EMOTIONIX_GEMINI_TIMEOUT", 10))
+SPOTIFY_TIMEOUT = float(os.environ.get("EMOTIONIX_SPOTIFY_TIMEOUT", 5))
+AI_FALLBACK = "No recommendations available at the moment."
+MUSIC_FALLBACK = ["No music recommendations available at the moment."]
+
+# Recommendations only depend on the emotion, so they are cached per emotion. Bump PROMPT_VERSION
+# whenever the prompt changes so old answers are not served. Entries are fresh for CACHE_TTL seconds
+# and served stale (while refreshing in the background) for CACHE_STALE_TTL more. Set
+# EMOTIONIX_REC_CACHE_DB to a SQLite file path to keep the cache across restarts.
+PROMPT_VERSION = 1
+CACHE_TTL = float(os.environ.get("EMOTIONIX_REC_CACHE_TTL", 3600))
+CACHE_STALE_TTL = float(os.environ.get("EMOTIONIX_REC_CACHE_STALE_TTL", 86400))
+CACHE_DB = os.environ.get("EMOTIONIX_REC_CACHE_DB") or None
+
+gemini_cache = TTLCache("gemini", ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, disk_path=CACHE_DB)
+spotify_cache = TTLCache("spotify", ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, disk_path=CACHE_DB)
+
+
+def _load_gemini():
+    import google.generativeai as genai
+    # Configure the API key and create the generative model instance once
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+
+def _load_spotify():
+    import spotipy
+    from spotipy.oauth2 import SpotifyOAuth
+    # Set up Spotify API authentication
+    return spotipy.Spotify(
+        auth_manager=SpotifyOAuth(
+            client_id=SPOTIFY_CLIENT_ID,
+            client_secret=SPOTIFY_CLIENT_SECRET,
+            redirect_uri=REDIRECT_URI,
+            scope="playlist-read-private"
+        )
     )
-)
 
-#Define the function to generate recommendations
-def generate_recommendations(emotion):
-    """
-    Generates recommendations using the Gemini model based on the detected emotion.
-    """
+
+register_model("gemini", _load_gemini)
+register_model("spotify", _load_spotify)
+
+# Define emotion-to-music mapping, keyed by canonical emotion
+emotion_to_music = {
+    Emotion.SAD: "happy music",
+    Emotion.HAPPY: "joyful party music",
+    Emotion.ANGRY: "calming music",
+    Emotion.CALM: "chill vibes",
+    Emotion.OPTIMISM: "energetic music",
+    Emotion.SURPRISED: "energetic music",
+    Emotion.FEARFUL: "uplifting acoustic songs",
+    Emotion.DISGUST: "calming music",
+}
+
+
+def mood_for_emotion(emotion):
+    """Returns the Spotify search query for any model label or synonym of an emotion."""
+    return emotion_to_music.get(normalize_emotion(emotion), "mood music")
+
+
+def normalize_emotion_key(emotion):
+    """Normalizes an emotion label for use in cache keys, so synonyms share one entry."""
+    canonical = normalize_emotion(emotion)
+    return canonical.value if canonical is not None else str(emotion).strip().lower()
+
+
+def _gemini_recommendations(emotion):
     prompt = (
         f"You are a helpful assistant for an emotional support application. Based on the detected emotion '{emotion}', "
         "please suggest some practical tips and YouTube video ideas that might help the user feel better."
     )
 
-    # Create the generative model instance
-    model = genai.GenerativeModel("gemini-1.5-flash")
+    # Reuse the generative model instance from the registry
+    model = get_model("gemini")
 
     # Generate content based on the prompt
-    response = model.generate_content(prompt)
+    with metrics.span("recommend.gemini"):
+        response = model.generate_content(prompt)
+    if not response.text:
+        raise ValueError("Gemini returned an empty response.")  # Not cached, so the next request retries
+    return response.text
 
-    # Return the generated content
-    return response.text if response.text else "No recommendations available at the moment."
+#Define the function to generate recommendations
+def generate_recommendations(emotion):
+    """
+    Generates recommendations using the Gemini model based on the detected emotion.
+    Answers are cached per emotion and prompt version.
+    """
+    key = f"v{PROMPT_VERSION}:{normalize_emotion_key(emotion)}"
+    try:
+        # Return the generated content
+        return gemini_cache.get_or_compute(key, lambda: _gemini_recommendations(normalize_emotion_key(emotion)))
+    except Exception as e:
+        metrics.record_error("recommend.gemini")
+        print(f"Warning: Gemini recommendations failed. Details: {e}")
+        return AI_FALLBACK
 #
 
 def fetch_spotify_recommendations(emotion):
     """
     Fetches Spotify playlists or songs based on the detected emotion.
     """
-    # Define emotion-to-music mapping
-    emotion_to_music = {
-        "Sad": "happy music",
-        "Happy": "joyful party music",
-        "Angry": "calming music",
-        "Relaxed": "chill vibes",
-        "Excited": "energetic music",
-        "Lonely": "uplifting acoustic songs"
-    }
-
     # Get the mood from the mapping or default to 'mood music'
-    mood = emotion_to_music.get(emotion, "mood music")
+    mood = mood_for_emotion(emotion)
 
     try:
-        # Use the Spotify instance to search playlists
-        results = sp.search(q=mood, type="playlist", limit=3)
+        # Emotions sharing a mood share one cached search
+        recommendations = spotify_cache.get_or_compute(mood, lambda: _search_spotify_playlists(mood))
+        return recommendations if recommendations else MUSIC_FALLBACK
+    except Exception as e:
+        metrics.record_error("recommend.spotify")
+        return [f"Error fetching music recommendations: {str(e)}"]
+
+
+def _search_spotify_playlists(mood, offset=0):
+    # Use the Spotify instance to search playlists; offset pages through further results
+    sp = get_model("spotify")
+    with metrics.span("recommend.spotify"):
+        results = sp.search(q=mood, type="playlist", limit=3, offset=offset)
+
+    recommendations = []
+    for playlist in results["playlists"]["items"]:
+        recommendations.append(
+            f"{playlist['name']} - {playlist['external_urls']['spotify']}"
+        )
+    return recommendations
+
+
+def recommendation_cache_stats():
+    """Returns hit/miss metrics of the Gemini and Spotify caches."""
+    return {"gemini": gemini_cache.metrics(), "spotify": spotify_cache.metrics()}
+
+# Precomputed recommendations (src/recommendation_pool.py), sampled before making any remote call
+_recommendation_pool = None
+
+
+def set_recommendation_pool(pool):
+    """Installs the pool fetch_all_recommendations samples from, or None to always call the backends."""
+    global _recommendation_pool
+    _recommendation_pool = pool
+
+
+# Shared pool for the remote calls; recreated in forked children (e.g. background jobs) whose threads are gone
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="recommend")
 
-        recommendations = []
-        for playlist in results["playlists"]["items"]:
-            recommendations.append(
-                f"{playlist['name']} - {playlist['external_urls']['spotify']}"
-            )
 
-        return recommendations if recommendations else ["No music recommendations available at the moment."]
+def _reset_executor():
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="recommend")
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor)
+
+
+def _result_or_fallback(future, timeout, fallback, backend):
+    # backend is "gemini" or "spotify", matching the recommend.<backend> stage names
+    try:
+        return future.result(timeout=max(timeout, 0))
+    except FutureTimeoutError:
+        metrics.increment("emotionix_recommend_timeouts_total", backend=backend)
+        print(f"Warning: {backend} recommendations timed out after {timeout:.1f}s.")
     except Exception as e:
-        return [f"Error fetching music recommendations: {str(e)}"]
+        metrics.record_error(f"recommend.{backend}")
+        print(f"Warning: {backend} recommendations failed. Details: {e}")
+    return fallback
+
+
+def fetch_all_recommendations(emotion, ai_timeout=None, music_timeout=None,
+                              ai_backend=None, music_backend=None):
+    """
+    Fetches AI and Spotify recommendations concurrently, so the latency is the slower
+    of the two calls rather than their sum. If one backend fails or exceeds its timeout,
+    its fallback is returned alongside the other backend's result. When a recommendation
+    pool is installed, pooled results are used and only missing parts call a backend.
+
+    Args:
+    - emotion (str): Detected emotion.
+    - ai_timeout (float | None): Seconds to wait for the AI backend. Defaults to GEMINI_TIMEOUT.
+    - music_timeout (float | None): Seconds to wait for the music backend. Defaults to SPOTIFY_TIMEOUT.
+    - ai_backend (callable | None): Replaces generate_recommendations, e.g. with a local stub.
+    - music_backend (callable | None): Replaces fetch_spotify_recommendations, e.g. with a local stub.
+
+    Returns:
+    - tuple: (ai_recommendations, music_recommendations)
+    """
+    ai_backend = ai_backend or generate_recommendations
+    music_backend = music_backend or fetch_spotify_recommendations
+
+    if _recommendation_pool is not None:
+        pooled_ai, pooled_music = _recommendation_pool.sample(emotion)
+        if pooled_ai is not None and pooled_music is not None:
+            metrics.increment("emotionix_recommend_pool_hits_total")
+            return pooled_ai, pooled_music
+        if pooled_ai is not None:
+            ai_backend = lambda _: pooled_ai
+        if pooled_music is not None:
+            music_backend = lambda _: pooled_music
+    ai_timeout = GEMINI_TIMEOUT if ai_timeout is None else ai_timeout
+    music_timeout = SPOTIFY_TIMEOUT if music_timeout is None else music_timeout
+
+    start_time = time.monotonic()
+    # Each call runs in a copy of the caller's context, so its spans join the caller's trace
+    ai_future = _executor.submit(contextvars.copy_context().run, ai_backend, emotion)
+    music_future = _executor.submit(contextvars.copy_context().run, music_backend, emotion)
+
+    # Both calls started together, so each timeout counts from the same start time
+    ai_recommendations = _result_or_fallback(ai_future, ai_timeout, AI_FALLBACK, "gemini")
+    elapsed = time.monotonic() - start_time
+    music_recommendations = _result_or_fallback(music_future, music_timeout - elapsed, MUSIC_FALLBACK, "spotify")
+    metrics.observe(metrics.STAGE_METRIC, time.monotonic() - start_time, stage="recommend.total")
+    return ai_recommendations, music_recommendations
+
 
 def main():
     print("Welcome to Emotionix Support System!")
@@ -77,15 +237,12 @@ def main():
     # Get the detected emotion from the user
     detected_emotion = input("Enter the detected emotion: ").strip().capitalize()
 
-    # Fetch AI-generated recommendations
+    # Fetch AI-generated and Spotify music recommendations concurrently
     print("\nFetching recommendations for you...")
-    ai_recommendations = generate_recommendations(detected_emotion)
+    ai_recommendations, music_recommendations = fetch_all_recommendations(detected_emotion)
     print("\nHere are the AI-generated recommendations:")
     print(ai_recommendations)
 
-    # Fetch Spotify music recommendations
-    print("\nFetching Spotify music recommendations...")
-    music_recommendations = fetch_spotify_recommendations(detected_emotion)
     print("\nHere are some music recommendations for you:")
     for recommendation in music_recommendations:
         print(f"- {recommendation}")
@@ -0,0 +1,149 @@
+import os
+import random
+import threading
+import time
+from src import recommend
+from src.emotions import EMOTION_LABELS
+
+# Every detector label and synonym normalizes to one of the canonical emotions
+POOL_EMOTIONS = EMOTION_LABELS
+
+# Entries kept per emotion, refill threshold, and how often one entry per emotion is replaced
+POOL_SIZE = int(os.environ.get("EMOTIONIX_REC_POOL_SIZE", 5))
+LOW_WATER = int(os.environ.get("EMOTIONIX_REC_POOL_LOW_WATER", 2))
+REFRESH_INTERVAL = float(os.environ.get("EMOTIONIX_REC_POOL_REFRESH", 1800))
+# Entries older than this are dropped, which is what pulls a pool below its low-water mark
+MAX_AGE = float(os.environ.get("EMOTIONIX_REC_POOL_MAX_AGE", 6 * 3600))
+# How often the refresher checks for pools below the low-water mark; also the retry delay after a failed fill
+CHECK_INTERVAL = 60
+
+
+def _default_ai_backend(emotion):
+    # Bypass the per-emotion cache so every pool entry is a distinct Gemini answer
+    return recommend._gemini_recommendations(emotion)
+
+
+def _default_music_backend(emotion, offset):
+    return recommend._search_spotify_playlists(recommend.mood_for_emotion(emotion), offset=offset)
+
+
+class RecommendationPool:
+    """
+    Keeps several ready-made Gemini texts and Spotify playlist sets per emotion.
+
+    sample() picks a random pooled entry without any remote call. A background refresher in
+    the process that called start() tops every pool up to `pool_size`, refills pools that fell
+    below `low_water` within `check_interval` seconds, and replaces the oldest entry of each
+    pool every `refresh_interval` seconds so content rotates. Processes forked from it (e.g.
+    background jobs) sample the pools as of their fork and never refresh them.
+    """
+
+    def __init__(self, emotions=POOL_EMOTIONS, pool_size=POOL_SIZE, low_water=LOW_WATER,
+                 refresh_interval=REFRESH_INTERVAL, max_age=MAX_AGE, check_interval=CHECK_INTERVAL,
+                 ai_backend=_default_ai_backend, music_backend=_default_music_backend):
+        """
+        Args:
+        - emotions (iterable[str]): Emotions to keep pools for.
+        - pool_size (int): Entries kept per emotion and kind.
+        - low_water (int): Pool size that triggers an immediate refill.
+        - refresh_interval (float): Seconds between scheduled rotations.
+        - max_age (float): Seconds after which an entry is dropped.
+        - check_interval (float): Seconds between low-water checks.
+        - ai_backend (callable): emotion -> recommendation text.
+        - music_backend (callable): (emotion, offset) -> list of "name - url" strings.
+        """
+        self.emotions = tuple(recommend.normalize_emotion_key(emotion) for emotion in emotions)
+        self.pool_size = pool_size
+        self.low_water = low_water
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.ai_backend = ai_backend
+        self.music_backend = music_backend
+        # Lists of (value, created_at). They are replaced, never mutated, so sample() needs no lock.
+        self._ai = {emotion: [] for emotion in self.emotions}
+        self._music = {emotion: [] for emotion in self.emotions}
+        self._music_offsets = {emotion: 0 for emotion in self.emotions}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self, emotion):
+        """
+        Returns (ai_text, playlists) for the emotion; either is None if its pool is empty.
+        """
+        key = recommend.normalize_emotion_key(emotion)
+        ai_entries = self._ai.get(key)
+        music_entries = self._music.get(key)
+        if ai_entries is None:
+            return None, None
+        ai_text = random.choice(ai_entries)[0] if ai_entries else None
+        playlists = random.choice(music_entries)[0] if music_entries else None
+        return ai_text, playlists
+
+    def sizes(self):
+        """Returns {emotion: (ai entries, music entries)}."""
+        return {emotion: (len(self._ai[emotion]), len(self._music[emotion])) for emotion in self.emotions}
+
+    def _fill(self, pools, emotion, produce, rotate):
+        now = time.time()
+        entries = [entry for entry in pools[emotion] if now - entry[1] < self.max_age]
+        if rotate and len(entries) >= self.pool_size:
+            entries = sorted(entries, key=lambda entry: entry[1])[1:]  # Drop the oldest to make room
+        # At most one backend call per missing entry; a failure or empty answer waits for the next check
+        for _ in range(self.pool_size - len(entries)):
+            if self._stop.is_set():
+                break
+            try:
+                value = produce(emotion)
+            except Exception as e:
+                print(f"Warning: Recommendation pool refresh failed for '{emotion}'. Details: {e}")
+                break
+            if not value:
+                print(f"Warning: Recommendation pool refresh for '{emotion}' returned nothing; retrying later.")
+                break
+            entries = entries + [(value, time.time())]
+            pools[emotion] = entries  # Publish each new entry as soon as it exists
+        pools[emotion] = entries
+
+    def _next_playlists(self, emotion):
+        offset = self._music_offsets[emotion]
+        self._music_offsets[emotion] = (offset + 3) % (3 * self.pool_size * 2)
+        return self.music_backend(emotion, offset)
+
+    def refresh(self, rotate=False):
+        """Tops every pool up, optionally replacing the oldest entry of each full pool first."""
+        for emotion in self.emotions:
+            self._fill(self._ai, emotion, self.ai_backend, rotate)
+            self._fill(self._music, emotion, self._next_playlists, rotate)
+
+    def below_low_water(self):
+        """Returns True if any pool has fewer than low_water entries that are not expired."""
+        now = time.time()
+        return any(
+            sum(now - created_at < self.max_age for _, created_at in pools[emotion]) < self.low_water
+            for pools in (self._ai, self._music)
+            for emotion in self.emotions
+        )
+
+    def _run(self):
+        self.refresh()
+        last_rotation = time.monotonic()
+        while not self._stop.wait(timeout=min(self.check_interval, self.refresh_interval)):
+            if time.monotonic() - last_rotation >= self.refresh_interval:
+                self.refresh(rotate=True)
+                last_rotation = time.monotonic()
+            elif self.below_low_water():
+                self.refresh()
+
+    def start(self):
+        """Starts the background refresher and installs the pool in src.recommend."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="recommendation-pool", daemon=True)
+            self._thread.start()
+        recommend.set_recommendation_pool(self)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        recommend.set_recommendation_pool(None)
@@ -1,9 +1,137 @@
-from transformers import pipeline
-classifier = pipeline("sentiment-analysis", model="cardiffnlp/twitter-roberta-base-emotion")
-def detect_text_emotion(text):
+import hashlib
+import os
+import unicodedata
+import numpy as np
+from src.model_registry import register_model, get_model
+from src.batching import MicroBatcher
+from src.cache import TTLCache
+from src.emotions import canonical_label, to_score_vector
+from src import metrics
+from src.inference_backends import backend_from_env, load_sequence_classifier
+
+TEXT_MODEL_NAME = "cardiffnlp/twitter-roberta-base-emotion"
+# "pytorch", "int8" (dynamic quantization) or "onnx" (ONNX Runtime); see src/inference_backends.py
+TEXT_BACKEND = backend_from_env("EMOTIONIX_TEXT_BACKEND")
+
+# Concurrent detect_text_emotion calls are grouped into batches of up to this many texts,
+# waiting at most this many milliseconds for a batch to fill
+MAX_BATCH_SIZE = int(os.environ.get("EMOTIONIX_TEXT_MAX_BATCH", 32))
+MAX_WAIT_MS = float(os.environ.get("EMOTIONIX_TEXT_MAX_WAIT_MS", 10))
+
+# Results are cached by a hash of the normalized text and the model version, so repeated texts skip
+# the model. The in-memory cache holds up to EMOTIONIX_TEXT_CACHE_MB (0 disables it); set
+# EMOTIONIX_TEXT_CACHE_DB to a SQLite file path to share results between processes and restarts.
+# Bump RESULT_VERSION whenever a change alters the scores the model produces for a text.
+RESULT_VERSION = 2
+TEXT_MODEL_VERSION = f"{TEXT_MODEL_NAME}:{TEXT_BACKEND}:{RESULT_VERSION}"
+CACHE_MB = float(os.environ.get("EMOTIONIX_TEXT_CACHE_MB", 32))
+CACHE_DB = os.environ.get("EMOTIONIX_TEXT_CACHE_DB") or None
+
+
+def _load_classifier():
+    return load_sequence_classifier(TEXT_MODEL_NAME, TEXT_BACKEND)
+
+
+register_model("text_classifier", _load_classifier)
+
+
+@metrics.timed("text.inference")
+def _classify_batch(texts):
+    """Returns a (label, score vector) pair per text from a single forward pass."""
+    classifier = get_model("text_classifier")
+    metrics.increment("emotionix_text_batch_items_total", len(texts))
+    # The classifier pads the batch to its longest text and returns the score of every label
+    outputs = []
+    for scores in classifier(texts):
+        outputs.append((canonical_label(max(scores, key=scores.get)), to_score_vector(scores)))
+    return outputs
+
+
+_batcher = MicroBatcher(_classify_batch, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, name="text-batcher")
+# A text's result never goes stale for a given model version, which is part of the key
+result_cache = TTLCache(
+    "text", max_entries=10 ** 9, ttl=float("inf"), disk_path=CACHE_DB, max_bytes=int(CACHE_MB * 1024 * 1024)
+) if CACHE_MB > 0 else None
+
+
+def _cache_key(text):
+    # Unicode forms and surrounding/repeated whitespace do not change the classification;
+    # case does, since the model is cased
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(f"{TEXT_MODEL_VERSION}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+# Cached as [label, [scores...]] so entries are JSON-serializable for the SQLite tier
+def _to_cached(output):
+    label, scores = output
+    return [label, scores.tolist()]
+
+
+def _from_cached(value):
+    label, scores = value
+    return label, np.asarray(scores, dtype=np.float32)
+
+
+def text_cache_stats():
+    """Returns hit/miss metrics of the text result cache, or None when it is disabled."""
+    return result_cache.metrics() if result_cache is not None else None
+
+
+def detect_text_emotion_batch(texts, return_scores=False):
+    """
+    Detects the emotion of each text in one batched forward pass.
+    Returns a list of labels in input order, or None if detection failed.
+    With return_scores=True each entry is a (label, scores) pair, where scores
+    is a NumPy vector ordered like src.emotions.EMOTION_LABELS.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
     try:
-        result = classifier(text)
-        return result[0]["label"]  # Returns the detected emotion label
+        outputs = [None] * len(texts)
+        # Only texts missing from the cache are classified, once per cache key, so texts
+        # that differ only in whitespace or Unicode form share one classification
+        missing = {}  # cache key -> (text to classify, indices of every text with that key)
+        for i, text in enumerate(texts):
+            key = _cache_key(text)
+            cached = result_cache.get(key) if result_cache is not None and key not in missing else None
+            if cached is not None:
+                outputs[i] = _from_cached(cached)
+            else:
+                missing.setdefault(key, (text, []))[1].append(i)
+        pending = list(missing.items())
+        for start in range(0, len(pending), MAX_BATCH_SIZE):
+            chunk = pending[start:start + MAX_BATCH_SIZE]
+            for (key, (_, indices)), output in zip(chunk, _classify_batch([text for _, (text, _) in chunk])):
+                if result_cache is not None:
+                    result_cache.set(key, _to_cached(output))
+                for i in indices:
+                    outputs[i] = output
+        return outputs if return_scores else [label for label, _ in outputs]
     except Exception as e:
+        metrics.record_error("text.detect")
         print("Error in text emotion detection:", e)
         return None
+
+
+def detect_text_emotion(text, return_scores=False):
+    """
+    Detects the emotion of a single text.
+    Returns the label, or a (label, scores) pair when return_scores is True.
+    """
+    # Queue the text with other concurrent requests and wait for its batch
+    with metrics.span("text.detect"):
+        try:
+            if result_cache is None:
+                label, scores = _batcher.submit(text).result()
+            else:
+                # Concurrent requests for the same text share one classification
+                label, scores = _from_cached(result_cache.get_or_compute(
+                    _cache_key(text), lambda: _to_cached(_batcher.submit(text).result())
+                ))
+        except Exception as e:
+            # Handled here, so the span does not count it again
+            metrics.record_error("text.detect")
+            print("Error in text emotion detection:", e)
+            return (None, None) if return_scores else None
+    return (label, scores) if return_scores else label  # Returns the detected emotion label
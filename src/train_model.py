@@ -1,11 +1,17 @@
 
 import os
+import argparse
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
 import librosa
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.svm import SVC
 import joblib
 import librosa.effects as effects
+from src.feature_store import FeatureStoreWriter, open_feature_store
+from src import audio_features
 
 # Define the path to your audio dataset
 DATASET_PATH = r"RAVDESS"
@@ -13,8 +19,14 @@ DATASET_PATH = r"RAVDESS"
 # Specify the path for saving the model
 model_path = r"emotion_model.pkl"
 
-# Create the directory if it doesn't exist
-os.makedirs(os.path.dirname(model_path), exist_ok=True)
+# Per-file feature cache; bump the version whenever feature extraction changes
+FEATURE_CACHE_DIR = r".feature_cache"
+FEATURE_CACHE_VERSION = 4
+FEATURE_SETS = audio_features.FEATURE_SETS
+
+# Extracted features are written to this memory-mapped feature store, STORE_CHUNK_ROWS rows at a time
+FEATURE_STORE_PATH = r"feature_store"
+STORE_CHUNK_ROWS = 512
 
 # Emotion labels mapping
 emotion_map = {
@@ -29,25 +41,8 @@ emotion_map = {
 }
 def extract_features(audio_data, sample_rate):
     """Extract various audio features from an audio file."""
-    # MFCCs
-    mfccs = librosa.feature.mfcc(y=audio_data, sr=sample_rate, n_mfcc=13)
-    mfccs_mean = np.mean(mfccs.T, axis=0)
-
-    # Chroma
-    chroma = librosa.feature.chroma_stft(y=audio_data, sr=sample_rate)
-    chroma_mean = np.mean(chroma.T, axis=0)
-
-    # Mel-spectrogram
-    mel = librosa.feature.melspectrogram(y=audio_data, sr=sample_rate)
-    mel_mean = np.mean(mel.T, axis=0)
-
-    # Spectral contrast
-    contrast = librosa.feature.spectral_contrast(y=audio_data, sr=sample_rate)
-    contrast_mean = np.mean(contrast.T, axis=0)
-
-    # Concatenate all features
-    features = np.concatenate((mfccs_mean, chroma_mean, mel_mean, contrast_mean))
-    return features
+    # MFCCs, chroma, mel-spectrogram and spectral contrast, all derived from a single STFT
+    return audio_features.extract_features(audio_data, sample_rate, "full")
 
 def augment_audio(audio_data, sample_rate):
     # Original audio
@@ -62,13 +57,47 @@ def augment_audio(audio_data, sample_rate):
     yield speed_changed
 
 
-def extract_features_from_dataset(dataset_path):
-    features = []
-    labels = []
-    print(f"Dataset path: {dataset_path}")  # Confirm the dataset path
+def _file_features(variants, sample_rate, feature_set):
+    """Returns the training feature rows for the variants of one clip, batching variants of equal length."""
+    return audio_features.extract_features_many(list(variants), sample_rate, feature_set)
+
+
+def _cache_path(cache_dir, full_path, feature_set, augment):
+    """Builds the cache file name from the file's path, mtime and the feature configuration."""
+    stat = os.stat(full_path)
+    key = json.dumps(
+        [os.path.abspath(full_path), stat.st_mtime_ns, stat.st_size, feature_set, augment, FEATURE_CACHE_VERSION]
+    )
+    return os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy")
+
+
+def _process_file(task):
+    """
+    Extracts the features of one audio file, reusing the on-disk cache when it is up to date.
+    Runs inside the worker processes, so it only takes and returns picklable values.
+    Returns a 2-D array with one row per (possibly augmented) variant of the clip.
+    """
+    full_path, feature_set, augment, cache_dir = task
+    cache_file = _cache_path(cache_dir, full_path, feature_set, augment) if cache_dir else None
+    if cache_file and os.path.exists(cache_file):
+        return np.load(cache_file)
 
+    audio_data, sample_rate = librosa.load(full_path, sr=None)
+    variants = augment_audio(audio_data, sample_rate) if augment else [audio_data]
+    rows = _file_features(variants, sample_rate, feature_set)
+
+    if cache_file:
+        # Write to a temporary file first so concurrent runs never read a partial cache entry
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp.npy"
+        np.save(tmp_file, rows)
+        os.replace(tmp_file, cache_file)
+    return rows
+
+
+def list_dataset_files(dataset_path):
+    """Yields (full_path, emotion_label, actor_dir) for every labelled .wav file in the dataset."""
     # Loop through each actor's directory
-    for actor_dir in os.listdir(dataset_path):
+    for actor_dir in sorted(os.listdir(dataset_path)):
         actor_path = os.path.join(dataset_path, actor_dir)
 
         # Check if it's a directory
@@ -76,45 +105,145 @@ def extract_features_from_dataset(dataset_path):
             print(f"Processing actor directory: {actor_dir}")  # Print each actor directory being processed
 
             # Loop through each audio file in the actor's directory
-            for filename in os.listdir(actor_path):
+            for filename in sorted(os.listdir(actor_path)):
                 full_path = os.path.join(actor_path, filename)
 
                 # Process only .wav files
                 if filename.endswith(".wav") and os.path.isfile(full_path):
-                    print(f"Processing file: {filename}")  # Print each file being processed
-
                     # Extract the emotion ID from the filename (adjust as necessary)
                     emotion_id = filename.split("-")[2]  # Adjust this based on actual filename format
                     emotion_label = emotion_map.get(emotion_id)
 
                     if emotion_label:
-                        audio_data, sample_rate = librosa.load(full_path, sr=None)
-                        mfccs = librosa.feature.mfcc(y=audio_data, sr=sample_rate, n_mfcc=13)
-                        mfccs_mean = np.mean(mfccs.T, axis=0)
-
-                        features.append(mfccs_mean)
-                        labels.append(emotion_label)
+                        yield full_path, emotion_label, actor_dir
                     else:
                         print(f"Invalid emotion label for file: {filename}")
 
-    print(f"Extracted {len(features)} features and {len(labels)} labels.")  # Final count
-    return np.array(features), np.array(labels)
 
-print("Files in dataset directory:")
-print(os.listdir(DATASET_PATH))
+def extract_features_from_dataset(dataset_path, feature_set="mfcc", augment=False, workers=None,
+                                  cache_dir=FEATURE_CACHE_DIR, store_path=None):
+    """
+    Extracts features for every labelled file in the dataset on a pool of worker processes.
+
+    Args:
+    - dataset_path (str): Root of the RAVDESS-style dataset (one directory per actor).
+    - feature_set (str): "mfcc" for the 13 mean MFCCs used by voice_detection, or "full"
+      for MFCC + chroma + mel + spectral contrast (extract_features).
+    - augment (bool): Also add pitch-shifted and time-stretched copies (augment_audio).
+    - workers (int | None): Number of processes. Defaults to the CPU count; 1 runs in-process.
+    - cache_dir (str | None): Directory for per-file feature caches. None disables caching.
+    - store_path (str | None): Write the features to a feature store (src/feature_store.py)
+      in chunks while extraction runs instead of collecting them in memory.
+
+    Returns:
+    - tuple: (features, labels) NumPy arrays. With store_path they are memory-mapped
+      views of the written store.
+    """
+    if feature_set not in FEATURE_SETS:
+        raise ValueError(f"Unknown feature set '{feature_set}'. Choose from {FEATURE_SETS}.")
+    print(f"Dataset path: {dataset_path}")  # Confirm the dataset path
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
 
+    files = list(list_dataset_files(dataset_path))
+    tasks = [(full_path, feature_set, augment, cache_dir) for full_path, _, _ in files]
 
-# Extract features and labels
-X, y = extract_features_from_dataset(DATASET_PATH)
+    if workers == 1:
+        results = map(_process_file, tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # Several files per task keeps inter-process overhead small next to librosa work
+        chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+        results = executor.map(_process_file, tasks, chunksize=chunksize)
 
-# Split the dataset
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    features = []
+    labels = []
+    actors = []
+    sources = []
+    writer = None
+    try:
+        for (full_path, emotion_label, actor_dir), rows in zip(files, results):
+            features.extend(rows)
+            labels.extend([emotion_label] * len(rows))
+            actors.extend([actor_dir] * len(rows))
+            sources.extend([full_path] * len(rows))
+
+            # Flush full chunks to the store so only one chunk is ever held in memory
+            if store_path and len(features) >= STORE_CHUNK_ROWS:
+                if writer is None:
+                    writer = _open_store_writer(store_path, len(features[0]), feature_set, augment)
+                writer.append(features, labels, actors, sources)
+                features, labels, actors, sources = [], [], [], []
+
+        if store_path:
+            if writer is None:
+                n_features = len(features[0]) if features else 0
+                writer = _open_store_writer(store_path, n_features, feature_set, augment)
+            if features:
+                writer.append(features, labels, actors, sources)
+            writer.close()
+    finally:
+        # A failed extraction must not leave open files or a half-written store behind
+        if writer is not None and not writer.closed:
+            writer.discard()
+        if workers != 1:
+            executor.shutdown(cancel_futures=True)
+
+    if store_path:
+        store = open_feature_store(store_path)
+        print(f"Extracted {len(store)} features and {len(store.labels)} labels into {store_path}.")  # Final count
+        return store.features, store.labels
 
-# Train the SVM model
-model = SVC(kernel='linear')
-model.fit(X_train, y_train)
+    print(f"Extracted {len(features)} features and {len(labels)} labels.")  # Final count
+    return np.array(features), np.array(labels)
 
-# Save the trained model
-joblib.dump(model, model_path)
 
-print("Model trained and saved successfully!")
+def _open_store_writer(store_path, n_features, feature_set, augment):
+    metadata = {"feature_set": feature_set, "augment": augment, "emotion_map": emotion_map}
+    return FeatureStoreWriter(store_path, n_features, metadata=metadata)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the voice emotion model on the RAVDESS dataset.")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="Path to the dataset root.")
+    parser.add_argument("--workers", type=int, default=None, help="Feature extraction processes (default: CPU count).")
+    parser.add_argument("--feature-set", choices=FEATURE_SETS, default="mfcc",
+                        help="'full' adds chroma/mel/contrast; the feature set is saved with the model.")
+    parser.add_argument("--augment", action="store_true", help="Add pitch-shifted and time-stretched copies.")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute every file instead of using the feature cache.")
+    parser.add_argument("--store", default=FEATURE_STORE_PATH, help="Feature store directory to write and train from.")
+    parser.add_argument("--from-store", action="store_true", help="Train from an existing feature store without extracting.")
+    args = parser.parse_args()
+
+    if args.from_store:
+        store = open_feature_store(args.store)
+        X, y = store.features, store.labels
+        feature_set = store.metadata.get("feature_set", "mfcc")
+    else:
+        print("Files in dataset directory:")
+        print(os.listdir(args.dataset))
+
+        # Extract features and labels
+        X, y = extract_features_from_dataset(
+            args.dataset,
+            feature_set=args.feature_set,
+            augment=args.augment,
+            workers=args.workers,
+            cache_dir=None if args.no_cache else FEATURE_CACHE_DIR,
+            store_path=args.store,
+        )
+        feature_set = args.feature_set
+
+    # Split the dataset
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Train the SVM model; probability=True lets detect_voice_emotion return calibrated scores
+    model = SVC(kernel='linear', probability=True)
+    model.fit(X_train, y_train)
+    # voice_detection reads this back to extract the same features at serving time
+    model.feature_set_ = feature_set
+
+    # Save the trained model
+    joblib.dump(model, model_path)
+
+    print("Model trained and saved successfully!")
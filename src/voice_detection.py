@@ -3,31 +3,47 @@ import numpy as np
 import joblib
 import sounddevice as sd
 import librosa
-from sklearn.svm import SVC
 from scipy.io.wavfile import write
+from src.model_registry import register_model, get_model
+from src.emotions import canonical_label, to_score_vector
+from src import audio_features, metrics
 
 MODEL_PATH = r"emotion_model.pkl"
 SAMPLE_RATE = 22050  
 DURATION = 15      
 
-try:
-    model = joblib.load(MODEL_PATH)
-    print("Voice emotion model loaded successfully.")
-except FileNotFoundError:
-    print(f"Model not found at {MODEL_PATH}. Please train the model first.")
-    raise
+def _load_voice_model():
+    try:
+        model = joblib.load(MODEL_PATH)
+        print("Voice emotion model loaded successfully.")
+        return model
+    except FileNotFoundError:
+        print(f"Model not found at {MODEL_PATH}. Please train the model first.")
+        raise
+
+register_model("voice_svc", _load_voice_model)
+
+def model_feature_set(model):
+    """
+    Returns the feature set ("mfcc" or "full") a voice model was trained on.
+    Models saved before train_model recorded it were trained on MFCCs.
+    """
+    feature_set = getattr(model, "feature_set_", "mfcc")
+    if feature_set not in audio_features.FEATURE_SETS:
+        raise ValueError(f"Voice model was trained on unknown feature set '{feature_set}'.")
+    return feature_set
 
-def extract_features(audio_data, sr=SAMPLE_RATE, n_mfcc=13):
+def extract_features(audio_data, sr=SAMPLE_RATE, n_mfcc=13, feature_set="mfcc"):
     """
-    Extracts MFCC features from audio data.
+    Extracts mean audio features from audio data.
     :param audio_data: The audio signal from which to extract features.
     :param sr: Sampling rate of the audio signal.
     :param n_mfcc: Number of MFCC features to extract.
-    :return: Mean MFCC features as a 1D numpy array.
+    :param feature_set: "mfcc" (13 values) or "full" (160 values); must match the model's, see model_feature_set.
+    :return: Mean features as a 1D numpy array.
     """
-    mfccs = librosa.feature.mfcc(y=audio_data, sr=sr, n_mfcc=n_mfcc)
-    mfccs_mean = np.mean(mfccs.T, axis=0)  # Shape should be (13,)
-    return mfccs_mean
+    # Same extractor as training, so served features always match the trained ones
+    return audio_features.extract_features(audio_data, sr, feature_set, n_mfcc=n_mfcc)
 
 def record_audio(duration=DURATION, sr=SAMPLE_RATE):
     """
@@ -43,21 +59,68 @@ def record_audio(duration=DURATION, sr=SAMPLE_RATE):
     print("Recording finished.")
     return audio_data
 
-def detect_voice_emotion():
+def load_audio(path, sr=SAMPLE_RATE):
+    """
+    Loads an audio file as a mono signal, standing in for a live recording.
+    :param path: Audio file to load.
+    :param sr: Sampling rate to resample to.
+    :return: Audio data as a numpy array.
+    """
+    audio_data, _ = librosa.load(path, sr=sr)
+    return audio_data
+
+def predict_with_scores(model, features_2d):
+    """
+    Predicts labels and a score vector per row in the same pass over the classifier.
+    Uses predict_proba when the model was trained with probability=True and a softmax
+    over the one-vs-rest decision function otherwise.
+    :param model: Trained scikit-learn classifier.
+    :param features_2d: Feature matrix of shape (n_samples, n_features).
+    :return: (labels, scores) where scores has one row per sample over EMOTION_LABELS.
+    """
+    # hasattr rather than model.probability, which newer scikit-learn releases deprecate to a string
+    if hasattr(model, "predict_proba"):
+        class_scores = model.predict_proba(features_2d)
+    else:
+        decision = np.atleast_2d(model.decision_function(features_2d))
+        decision = np.exp(decision - decision.max(axis=1, keepdims=True))
+        class_scores = decision / decision.sum(axis=1, keepdims=True)
+    labels = [canonical_label(label) for label in model.classes_[np.argmax(class_scores, axis=1)]]
+    scores = np.stack([to_score_vector(dict(zip(model.classes_, row))) for row in class_scores])
+    return labels, scores
+
+def detect_voice_emotion(return_scores=False, audio=None):
     """
     Detects emotion from a live audio recording.
-    :return: Detected emotion label.
+    :param return_scores: Also return the score vector over src.emotions.EMOTION_LABELS.
+    :param audio: Audio file path or signal (at SAMPLE_RATE) to analyze instead of recording.
+    :return: Detected emotion label, or (label, scores) when return_scores is True.
     """
-    recorded_audio = record_audio()
-    features = extract_features(recorded_audio)
-    features_reshaped = features.reshape(1, -1)  
+    with metrics.span("voice.capture"):
+        if audio is None:
+            recorded_audio = record_audio()
+        elif isinstance(audio, str):
+            recorded_audio = load_audio(audio)
+        else:
+            recorded_audio = np.asarray(audio, dtype=np.float32)
     try:
-        predicted_emotion = model.predict(features_reshaped)[0]
+        model = get_model("voice_svc")
+        with metrics.span("voice.features"):
+            features = extract_features(recorded_audio, feature_set=model_feature_set(model))
+        features_reshaped = features.reshape(1, -1)
+        if return_scores:
+            with metrics.span("voice.inference"):
+                labels, scores = predict_with_scores(model, features_reshaped)
+            predicted_emotion = labels[0]
+            print(f"Detected Voice Emotion: {predicted_emotion}")
+            return predicted_emotion, scores[0]
+        with metrics.span("voice.inference"):
+            predicted_emotion = canonical_label(model.predict(features_reshaped)[0])
         print(f"Detected Voice Emotion: {predicted_emotion}")
         return predicted_emotion
     except Exception as e:
         print(f"Error during emotion prediction: {e}")
-        return None
+        return (None, None) if return_scores else None
 
 if __name__ == "__main__":
     detect_voice_emotion()
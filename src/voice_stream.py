@@ -0,0 +1,171 @@
+import asyncio
+import queue
+import time
+import numpy as np
+import librosa
+from scipy.io import wavfile
+from src.model_registry import get_model
+from src.voice_detection import SAMPLE_RATE, extract_features, model_feature_set, predict_with_scores
+from src import metrics
+
+# Streaming defaults: predict over the last WINDOW_SECONDS of audio every HOP_MS milliseconds
+WINDOW_SECONDS = 1.0
+HOP_MS = 300
+BLOCK_MS = 50
+
+
+class RingBuffer:
+    """
+    Fixed-size float32 audio buffer addressed by absolute sample index.
+    Only the most recent `capacity` samples are kept.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self.total_written = 0
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        if len(samples) >= self.capacity:
+            # Only the tail fits; account for the dropped head as already written
+            self.total_written += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        start = self.total_written % self.capacity
+        end = start + len(samples)
+        if end <= self.capacity:
+            self._data[start:end] = samples
+        else:
+            split = self.capacity - start
+            self._data[start:] = samples[:split]
+            self._data[:end - self.capacity] = samples[split:]
+        self.total_written += len(samples)
+
+    def read(self, start, end):
+        """Returns samples [start, end) by absolute index; they must still be in the buffer."""
+        if start < self.total_written - self.capacity or end > self.total_written:
+            raise IndexError("Requested samples are no longer (or not yet) in the ring buffer.")
+        indices = np.arange(start, end) % self.capacity
+        return self._data[indices]
+
+
+def microphone_blocks(sr=SAMPLE_RATE, block_ms=BLOCK_MS, max_seconds=None):
+    """
+    Yields mono float32 blocks from the default microphone through a sounddevice input stream.
+    :param sr: Sampling rate.
+    :param block_ms: Size of each block in milliseconds.
+    :param max_seconds: Stop after this much audio, or run until the consumer stops iterating.
+    """
+    import sounddevice as sd
+
+    blocks = queue.Queue()
+
+    def callback(indata, frames, time_info, status):
+        if status:
+            print(f"Warning: Audio input status: {status}")
+        blocks.put(indata[:, 0].copy())
+
+    blocksize = int(sr * block_ms / 1000)
+    received = 0
+    with sd.InputStream(samplerate=sr, channels=1, dtype="float32", blocksize=blocksize, callback=callback):
+        while max_seconds is None or received < max_seconds * sr:
+            block = blocks.get()
+            received += len(block)
+            yield block
+
+
+def wav_file_blocks(path, sr=SAMPLE_RATE, block_ms=BLOCK_MS, realtime=False):
+    """
+    Yields mono float32 blocks from a WAV file, standing in for the microphone.
+    :param path: WAV file to read.
+    :param sr: Sampling rate to resample to.
+    :param block_ms: Size of each block in milliseconds.
+    :param realtime: Sleep between blocks to mimic a live input.
+    """
+    file_sr, audio_data = wavfile.read(path)
+    if audio_data.ndim > 1:
+        audio_data = audio_data.mean(axis=1)
+    if np.issubdtype(audio_data.dtype, np.integer):
+        audio_data = audio_data / np.iinfo(audio_data.dtype).max
+    audio_data = audio_data.astype(np.float32)
+    if file_sr != sr:
+        audio_data = librosa.resample(audio_data, orig_sr=file_sr, target_sr=sr)
+
+    blocksize = int(sr * block_ms / 1000)
+    for start in range(0, len(audio_data), blocksize):
+        if realtime:
+            time.sleep(block_ms / 1000)
+        yield audio_data[start:start + blocksize]
+
+
+def stream_voice_emotion(source=None, window_seconds=WINDOW_SECONDS, hop_ms=HOP_MS, sr=SAMPLE_RATE, return_scores=False):
+    """
+    Detects voice emotion continuously over a sliding window.
+
+    Each prediction extracts features from the last `window_seconds` of audio with the same
+    extractor and feature set as training (src.audio_features), so the classifier sees the
+    inputs it was trained on. Audio is kept in a ring buffer, so memory stays constant.
+    :param source: Iterable of audio blocks (e.g. wav_file_blocks(path)). Defaults to the microphone.
+    :param window_seconds: Length of audio each prediction looks at.
+    :param hop_ms: Time between predictions.
+    :param sr: Sampling rate of the source.
+    :param return_scores: Include the score vector over src.emotions.EMOTION_LABELS.
+    :return: Generator of dicts with the stream time in seconds and the predicted emotion.
+    """
+    if source is None:
+        source = microphone_blocks(sr=sr)
+    model = get_model("voice_svc")
+    feature_set = model_feature_set(model)
+
+    window_samples = int(window_seconds * sr)
+    hop_samples = int(sr * hop_ms / 1000)
+    buffer = RingBuffer(window_samples)
+    next_prediction_at = window_samples
+
+    for block in source:
+        buffer.write(block)
+        available = buffer.total_written
+
+        if available >= next_prediction_at:
+            start_time = time.perf_counter()
+            window = buffer.read(available - window_samples, available)
+            features = extract_features(window, sr, feature_set=feature_set).reshape(1, -1)
+            metrics.observe(metrics.STAGE_METRIC, time.perf_counter() - start_time, stage="voice_stream.features")
+            start_time = time.perf_counter()
+            labels, scores = predict_with_scores(model, features)
+            metrics.observe(metrics.STAGE_METRIC, time.perf_counter() - start_time, stage="voice_stream.inference")
+            result = {"time": available / sr, "emotion": labels[0]}
+            if return_scores:
+                result["scores"] = scores[0]
+            yield result
+            next_prediction_at = available + hop_samples
+
+
+async def astream_voice_emotion(**kwargs):
+    """
+    Async iterator over stream_voice_emotion. Audio reading and inference run on a worker
+    thread so the event loop is never blocked. Accepts the same keyword arguments.
+    """
+    results = stream_voice_emotion(**kwargs)
+    done = object()
+    pending = None
+    try:
+        while True:
+            # Shielded, so cancelling the consumer never abandons a read that is still running
+            pending = asyncio.ensure_future(asyncio.to_thread(next, results, done))
+            result = await asyncio.shield(pending)
+            if result is done:
+                break
+            yield result
+    finally:
+        # The generator cannot be closed while the worker thread is still inside it
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        results.close()
+
+
+if __name__ == "__main__":
+    import sys
+    source = wav_file_blocks(sys.argv[1], realtime=True) if len(sys.argv) > 1 else None
+    for prediction in stream_voice_emotion(source=source):
+        print(f"{prediction['time']:.1f}s: {prediction['emotion']}")
@@ -0,0 +1,26 @@
+import os
+import sys
+import pytest
+
+# Modules import each other as src.<module>, so the repository root must be importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import model_registry  # noqa: E402
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    """
+    Returns install(name, loader), which replaces a registered model's loader for one test.
+    The model is unloaded before and after, and the real loader is restored afterwards.
+    """
+    installed = []
+
+    def install(name, loader):
+        monkeypatch.setitem(model_registry._loaders, name, loader)
+        model_registry.unload_model(name)
+        installed.append(name)
+
+    yield install
+    for name in installed:
+        model_registry.unload_model(name)
@@ -0,0 +1,18 @@
+import pytest
+from src.batching import MicroBatcher
+
+
+def test_results_follow_submission_order():
+    batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(5)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6, 8]
+
+
+def test_short_result_list_fails_every_caller():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=3, max_wait_ms=1000)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match="2 results for 3 items"):
+            future.result(timeout=5)
+    # The worker survives to serve later batches
+    assert batcher._worker.is_alive()
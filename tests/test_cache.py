@@ -0,0 +1,51 @@
+import threading
+import time
+from src.cache import TTLCache
+
+
+def test_concurrent_callers_share_one_computation():
+    cache = TTLCache("test")
+    calls = []
+    barrier = threading.Barrier(20)
+
+    def compute():
+        calls.append(1)
+        # Finish only once every other caller is waiting on this computation
+        deadline = time.monotonic() + 10
+        while cache.metrics().get("coalesced", 0) < 19 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return "value"
+
+    def caller():
+        barrier.wait()
+        assert cache.get_or_compute("key", compute) == "value"
+
+    threads = [threading.Thread(target=caller) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.metrics()
+    assert len(calls) == 1
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 19
+    assert stats["hit_rate"] == 19 / 20
+
+
+def test_hits_after_compute():
+    cache = TTLCache("test")
+    for _ in range(4):
+        cache.get_or_compute("key", lambda: 1)
+    stats = cache.metrics()
+    assert (stats["misses"], stats["hits"]) == (1, 3)
+    assert stats["hit_rate"] == 0.75
+
+
+def test_max_bytes_evicts_least_recently_used():
+    cache = TTLCache("test", max_bytes=600)
+    for i in range(10):
+        cache.set(str(i), [i, "abc"])
+    assert cache.get("0") is None
+    assert cache.get("9") == [9, "abc"]
+    assert cache.metrics()["bytes"] <= 600
@@ -0,0 +1,33 @@
+import os
+import numpy as np
+import pytest
+from src import train_model
+from src.feature_store import FeatureStoreWriter, open_feature_store
+
+
+def test_writer_round_trip(tmp_path):
+    with FeatureStoreWriter(str(tmp_path), 3, metadata={"feature_set": "mfcc"}) as writer:
+        writer.append(np.ones((2, 3)), ["happy", "sad"], actors=["a1", "a2"])
+    store = open_feature_store(str(tmp_path))
+    assert store.features.shape == (2, 3)
+    assert list(store.labels) == ["happy", "sad"]
+    assert store.metadata == {"feature_set": "mfcc"}
+
+
+def test_failed_extraction_leaves_no_partial_store(tmp_path, monkeypatch):
+    files = [(f"clip{i}.wav", "happy", "Actor_01") for i in range(3)]
+
+    def process_file(task):
+        if task[0] == "clip2.wav":
+            raise RuntimeError("corrupt file")
+        return np.ones((1, 13), dtype=np.float32)
+
+    monkeypatch.setattr(train_model, "list_dataset_files", lambda dataset_path: iter(files))
+    monkeypatch.setattr(train_model, "_process_file", process_file)
+    monkeypatch.setattr(train_model, "STORE_CHUNK_ROWS", 1)
+    store_path = str(tmp_path / "store")
+    with pytest.raises(RuntimeError, match="corrupt file"):
+        train_model.extract_features_from_dataset("dataset", workers=1, cache_dir=None, store_path=store_path)
+    assert os.listdir(store_path) == []
+    with pytest.raises(FileNotFoundError):
+        open_feature_store(store_path)
@@ -0,0 +1,114 @@
+import threading
+import time
+from contextlib import contextmanager
+import pytest
+from src.job_slots import JobSlots, JobsBusy
+
+
+class _MemoryCache:
+    """The part of diskcache.Cache that JobSlots uses, with expiring keys."""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.RLock()
+
+    def _live(self, key):
+        value, expires = self._items.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self._items[key]
+            return None
+        return value
+
+    def add(self, key, value, expire=None):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._items[key] = (value, time.monotonic() + expire)
+            return True
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def touch(self, key, expire=None):
+        with self._lock:
+            if self._live(key) is not None:
+                self._items[key] = (self._items[key][0], time.monotonic() + expire)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    @contextmanager
+    def transact(self):
+        with self._lock:
+            yield
+
+
+def test_hold_limits_concurrent_jobs():
+    slots = JobSlots(_MemoryCache(), "test", 2, poll_interval=0.01)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def job():
+        with slots.hold():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=job) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+    assert slots.in_use() == 0
+
+
+def test_full_waiting_line_raises_busy():
+    slots = JobSlots(_MemoryCache(), "test", 1, poll_interval=0.01, max_waiting=1)
+    running = threading.Event()
+    finish = threading.Event()
+    waiter_done = threading.Event()
+
+    def hold_until_finished():
+        with slots.hold():
+            running.set()
+            finish.wait()
+
+    def wait_for_slot():
+        with slots.hold():
+            pass
+        waiter_done.set()
+
+    holder = threading.Thread(target=hold_until_finished)
+    holder.start()
+    running.wait()
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    # The waiter holds the only waiting place until the slot frees up
+    while slots.waiting.in_use() == 0:
+        time.sleep(0.005)
+
+    with pytest.raises(JobsBusy):
+        with slots.hold():
+            pass
+
+    finish.set()
+    holder.join()
+    waiter.join()
+    assert waiter_done.is_set()
+    assert slots.in_use() == 0 and slots.waiting.in_use() == 0
+
+
+def test_dead_lease_expires():
+    cache = _MemoryCache()
+    slots = JobSlots(cache, "test", 1, lease_seconds=0.05, poll_interval=0.01)
+    slots.acquire()  # Never released, like a job that was killed
+    assert slots.try_acquire() is None
+    time.sleep(0.06)
+    assert slots.try_acquire() is not None
@@ -0,0 +1,103 @@
+import threading
+import pytest
+from src import recommend
+
+
+def _failing(emotion):
+    raise RuntimeError("backend down")
+
+
+@pytest.fixture(autouse=True)
+def no_pool():
+    recommend.set_recommendation_pool(None)
+    yield
+    recommend.set_recommendation_pool(None)
+
+
+@pytest.fixture
+def release():
+    # Backends blocked on this event are let go after the test, so no executor thread stays stuck
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_both_backends_succeed_concurrently():
+    # Each backend waits for the other to start, which only succeeds if they run together
+    both_started = threading.Barrier(2, timeout=5)
+
+    def backend(result):
+        def call(emotion):
+            both_started.wait()
+            return result
+        return call
+
+    ai, music = recommend.fetch_all_recommendations(
+        "sad", ai_timeout=10, music_timeout=10, ai_backend=backend("tips"), music_backend=backend(["playlist"])
+    )
+    assert (ai, music) == ("tips", ["playlist"])
+
+
+def test_timeout_returns_fallback_with_other_result(release):
+    def stuck_ai(emotion):
+        release.wait()
+        return "tips"
+
+    ai, music = recommend.fetch_all_recommendations(
+        "sad", ai_timeout=0.05, ai_backend=stuck_ai, music_backend=lambda emotion: ["playlist"]
+    )
+    assert ai == recommend.AI_FALLBACK
+    assert music == ["playlist"]
+
+
+def test_music_timeout_counts_from_shared_start(monkeypatch, release):
+    ai_done = threading.Event()
+    timeouts = {}
+    result_or_fallback = recommend._result_or_fallback
+
+    def record_timeout(future, timeout, fallback, backend):
+        if backend == "spotify":
+            # The AI result has already been waited for at this point
+            assert ai_done.is_set()
+        timeouts[backend] = timeout
+        return result_or_fallback(future, timeout, fallback, backend)
+
+    def slow_ai(emotion):
+        release.wait(0.1)
+        ai_done.set()
+        return "tips"
+
+    def stuck_music(emotion):
+        release.wait()
+        return ["playlist"]
+
+    monkeypatch.setattr(recommend, "_result_or_fallback", record_timeout)
+    ai, music = recommend.fetch_all_recommendations(
+        "sad", ai_timeout=5.0, music_timeout=0.2, ai_backend=slow_ai, music_backend=stuck_music,
+    )
+    assert ai == "tips"
+    assert music == recommend.MUSIC_FALLBACK
+    # The music wait is what is left of its timeout after the AI wait, not a fresh 0.2 s
+    assert timeouts["spotify"] <= 0.2 - 0.1
+
+
+def test_partial_failure_keeps_successful_result():
+    ai, music = recommend.fetch_all_recommendations("happy", ai_backend=lambda emotion: "tips", music_backend=_failing)
+    assert ai == "tips"
+    assert music == recommend.MUSIC_FALLBACK
+
+
+def test_all_backends_fail():
+    ai, music = recommend.fetch_all_recommendations("angry", ai_backend=_failing, music_backend=_failing)
+    assert (ai, music) == (recommend.AI_FALLBACK, recommend.MUSIC_FALLBACK)
+
+
+class _BrokenGemini:
+    def generate_content(self, prompt):
+        raise ConnectionError("quota exceeded")
+
+
+def test_gemini_client_errors_become_fallback(stub_model):
+    stub_model("gemini", _BrokenGemini)
+    recommend.gemini_cache.clear()
+    assert recommend.generate_recommendations("sad") == recommend.AI_FALLBACK
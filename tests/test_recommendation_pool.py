@@ -0,0 +1,45 @@
+import time
+from src import recommend
+from src.recommendation_pool import RecommendationPool
+
+
+def test_empty_backend_result_does_not_spin():
+    calls = []
+
+    def empty_music(emotion, offset):
+        calls.append(offset)
+        return []
+
+    pool = RecommendationPool(emotions=["sad"], pool_size=5, ai_backend=lambda emotion: "tips", music_backend=empty_music)
+    pool.refresh()
+    assert len(calls) == 1
+    assert pool.sizes() == {"sad": (5, 0)}
+    assert pool.sample("sad") == ("tips", None)
+
+
+def test_refresher_refills_pools_below_low_water():
+    ai_calls = []
+
+    def ai_backend(emotion):
+        ai_calls.append(emotion)
+        return f"tips {len(ai_calls) - 1}"
+
+    pool = RecommendationPool(
+        emotions=["happy"], pool_size=3, low_water=2, max_age=0.3, check_interval=0.05, refresh_interval=60,
+        ai_backend=ai_backend, music_backend=lambda emotion, offset: [f"playlist {offset}"],
+    )
+    pool.start()
+    try:
+        # Entries expire after max_age, and the server-side refresher replaces them without any sample() call
+        deadline = time.monotonic() + 10
+        while len(ai_calls) < 6 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(ai_calls) >= 6
+        while pool.sizes()["happy"] != (3, 3) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert pool.sizes()["happy"] == (3, 3)
+        assert not pool.below_low_water()
+        assert int(pool.sample("happy")[0].split()[-1]) >= 3
+    finally:
+        pool.stop()
+    assert recommend._recommendation_pool is None
@@ -0,0 +1,48 @@
+import pytest
+from src import metrics, text_detection
+
+
+@pytest.fixture(autouse=True)
+def empty_result_cache():
+    if text_detection.result_cache is not None:
+        text_detection.result_cache.clear()
+    yield
+    if text_detection.result_cache is not None:
+        text_detection.result_cache.clear()
+
+
+@pytest.fixture
+def classifier_calls(stub_model):
+    calls = []
+
+    def classify(texts):
+        calls.append(list(texts))
+        return [{"joy": 0.7, "sadness": 0.3} for _ in texts]
+
+    stub_model("text_classifier", lambda: classify)
+    return calls
+
+
+def test_batch_classifies_each_cache_key_once(classifier_calls):
+    labels = text_detection.detect_text_emotion_batch(["a", "b", "a", " a "])
+    assert labels == ["happy"] * 4
+    assert classifier_calls == [["a", "b"]]
+
+
+def test_repeated_text_is_served_from_cache(classifier_calls):
+    first = text_detection.detect_text_emotion("same  text", return_scores=True)
+    second = text_detection.detect_text_emotion(" same text ", return_scores=True)
+    assert first[0] == second[0] == "happy"
+    assert (first[1] == second[1]).all()
+    assert classifier_calls == [["same  text"]]
+
+
+def test_failure_returns_none_and_counts_one_error(stub_model):
+    def broken(texts):
+        raise RuntimeError("model down")
+
+    stub_model("text_classifier", lambda: broken)
+    key = (metrics.ERROR_METRIC, (("stage", "text.detect"),))
+    before = metrics._counters[key]
+    assert text_detection.detect_text_emotion("a failing text", return_scores=True) == (None, None)
+    assert metrics._counters[key] == before + 1